@@ -0,0 +1,81 @@
+"""
+Check that the native PLCopen XML emitter writes the same output as the Mako templates (byte for
+byte), and compare their throughput.
+
+Run it from the root of the repository:
+
+    $ python3 benchmarks/bench_backend.py [-i ./models/in/mercator] [-n 3]
+
+It exits with status 1 if the outputs of any model differ.
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import onto
+from util import imports, logger
+from util.context import BuildContext
+
+
+TEMPLATE_FP = Path('./templates/{filepath}.xml.mako')
+
+
+def render_time(templates: onto.Templates, lib, repeat: int) -> tuple[float, str]:
+    """Render the library a number of times, and return the best time and the output."""
+    best = None
+    for _ in range(repeat):
+        with lib.context.active():
+            t_start = time.perf_counter()
+            output = templates.render(TEMPLATE_FP, lib=lib)
+            elapsed = time.perf_counter() - t_start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the Mako and the native backend.")
+    parser.add_argument("-i", dest="INPUTDIR", default='./models/in/mercator',
+                        help="The directory to read the yaml input files from.")
+    parser.add_argument("-n", dest="REPEAT", type=int, default=3,
+                        help="The number of repetitions (the best one is reported).")
+    args = parser.parse_args()
+    logger.setLevel("WARNING")
+
+    graph = imports.build_graph(sorted(Path(args.INPUTDIR).rglob('*.yaml')))
+    load_order = imports.topological_order(graph)
+    context = BuildContext()
+    with context.active():
+        libs = { fp: onto.build(onto.load(fp)) for fp in load_order }
+
+    backends = { "mako": onto.Templates(backend="mako"), "native": onto.Templates(backend="native") }
+    backends["mako"].get(TEMPLATE_FP)
+
+    totals = { name: 0.0 for name in backends }
+    n_bytes = 0
+    differences = 0
+    print(f"Rendering {len(libs)} models, best of {args.REPEAT}:")
+    print(f"  {'model':40s} {'bytes':>9s} " + " ".join(f"{name:>8s}" for name in backends) + "  parity")
+    for fp, lib in libs.items():
+        if lib is None:
+            continue
+        times = {}
+        outputs = {}
+        for name, templates in backends.items():
+            times[name], outputs[name] = render_time(templates, lib, args.REPEAT)
+            totals[name] += times[name]
+        identical = outputs["mako"].encode() == outputs["native"].encode()
+        differences += not identical
+        n_bytes += len(outputs["mako"].encode())
+        print(f"  {str(fp):40s} {len(outputs['mako'].encode()):9d} "
+              + " ".join(f"{times[name]:7.3f}s" for name in backends)
+              + ("  ok" if identical else "  DIFFERENT"))
+
+    print(f"  {'total':40s} {n_bytes:9d} " + " ".join(f"{totals[name]:7.3f}s" for name in backends))
+    for name, total in totals.items():
+        print(f"  {name:8s} {n_bytes / total / 2**20:6.1f} MiB/s")
+    print(f"  speedup: {totals['mako'] / totals['native']:.1f}x")
+    if differences > 0:
+        print(f"  {differences} model(s) differ!")
+        sys.exit(1)
@@ -0,0 +1,99 @@
+"""
+Benchmark the cost of the debug logging when rendering a model in a non-verbose run (i.e. at the INFO level).
+
+The debug messages are formatted lazily: only if debug messages are actually logged. This is
+compared with formatting every message eagerly (like the f-strings that were passed to debug()
+before), and with not calling debug() at all. The debug() function of util.logger and the one
+imported by the templates are patched for these variants.
+
+Run it from the root of the repository:
+
+    $ python3 benchmarks/bench_logging.py [-i ./models/in/mercator/mtcs_axes.yaml] [-n 30]
+"""
+
+import argparse, gc, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import onto
+from util import imports, logger
+from util.context import BuildContext
+
+
+# the actual (lazy) debug function
+lazy_debug = logger.debug
+
+
+def eager_debug(msg, *args):
+    """Format the message, even if it's not logged."""
+    if args:
+        msg = msg % args
+    lazy_debug(msg)
+
+
+def no_debug(msg, *args):
+    pass
+
+
+VARIANTS = {
+    "eager formatting": eager_debug,
+    "lazy formatting": lazy_debug,
+    "no debug calls": no_debug,
+}
+
+
+def render_time(lib, template_fp: Path, debug) -> float:
+    """Render the library with the given debug function, and return the elapsed time."""
+    namespace = onto.TEMPLATES.get(Path('./templates/_iec61131.mako')).module
+    logger.debug = namespace.debug = debug
+    lib.context.paths.clear()
+    gc.collect()
+    gc.disable()
+    try:
+        with lib.context.active():
+            t_start = time.perf_counter()
+            onto.TEMPLATES.render(template_fp, lib=lib)
+            return time.perf_counter() - t_start
+    finally:
+        gc.enable()
+        logger.debug = namespace.debug = lazy_debug
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cost of the debug logging.")
+    parser.add_argument("-i", dest="INPUTFILE", default='./models/in/mercator/mtcs_axes.yaml',
+                        help="The yaml input file to render.")
+    parser.add_argument("-t", dest="TEMPLATE", default='./templates/{filepath}.xml.mako',
+                        help="The template to render.")
+    parser.add_argument("-n", dest="REPEAT", type=int, default=30,
+                        help="The number of repetitions (the best one is reported).")
+    args = parser.parse_args()
+    # like a non-verbose run, but without printing the info messages
+    logger.setLevel("INFO")
+    logger.record()
+
+    input_fp = imports.normalize(args.INPUTFILE)
+    load_order = imports.topological_order(imports.build_graph([input_fp]))
+    lib = None
+    with BuildContext().active():
+        for fp in load_order:
+            lib = onto.build(onto.load(fp))
+
+    template_fp = Path(args.TEMPLATE)
+    onto.TEMPLATES.get(template_fp)
+    print(f"Rendering {input_fp} with {template_fp} at the INFO level, best of {args.REPEAT}:")
+
+    # interleave the variants, so they suffer equally from any noise
+    times = { name: [] for name in VARIANTS }
+    for _ in range(args.REPEAT):
+        for name, debug in VARIANTS.items():
+            times[name].append(render_time(lib, template_fp, debug))
+    results = {}
+    for name in VARIANTS:
+        results[name] = min(times[name])
+        print(f"  {name:20s} {results[name]:7.3f}s")
+
+    overhead = results["lazy formatting"] - results["no debug calls"]
+    print(f"  overhead of the lazy debug calls: {overhead * 1000:+.1f}ms "
+          f"({overhead / results['no debug calls'] * 100:+.1f}%)")
@@ -0,0 +1,79 @@
+"""
+Benchmark the memory used by the object model of the yaml models (i.e. after creating the libraries).
+
+Run it from the root of the repository:
+
+    $ python3 benchmarks/bench_memory.py [-i ./models/in/mercator]
+"""
+
+import argparse, gc, sys, time, tracemalloc
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import onto
+from util import imports, objects
+
+
+def attributes(obj) -> list:
+    """Return the values of all attributes of an object (in its __dict__ or in its slots)."""
+    values = list(getattr(obj, '__dict__', {}).values())
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if slot != '__dict__' and hasattr(obj, slot):
+                values.append(getattr(obj, slot))
+    return values
+
+
+def instance_size(obj, seen: set) -> int:
+    """
+    Return the size of an object, including its __dict__ and the containers it holds.
+
+    Containers that are shared by several objects are only counted once.
+    """
+    size = sys.getsizeof(obj)
+    d = getattr(obj, '__dict__', None)
+    if d is not None:
+        size += sys.getsizeof(d)
+    for value in attributes(obj):
+        if isinstance(value, (dict, list, tuple, set)) and id(value) not in seen:
+            seen.add(id(value))
+            size += sys.getsizeof(value)
+    return size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the memory used by the object model.")
+    parser.add_argument("-i", dest="INPUTDIR", default='./models/in/mercator',
+                        help="The directory to read the yaml input files from.")
+    args = parser.parse_args()
+
+    graph = imports.build_graph(sorted(Path(args.INPUTDIR).rglob('*.yaml')))
+    load_order = imports.topological_order(graph)
+    models = [onto.load(fp) for fp in load_order]
+
+    gc.collect()
+    tracemalloc.start()
+    t_start = time.perf_counter()
+    libs = [onto.build(model) for model in models]
+    elapsed = time.perf_counter() - t_start
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    counts = Counter()
+    sizes = Counter()
+    seen = set()
+    for obj in gc.get_objects():
+        if isinstance(obj, objects.Object):
+            name = type(obj).__name__
+            counts[name] += 1
+            sizes[name] += instance_size(obj, seen)
+
+    print(f"Created the libraries of {len(load_order)} files in {elapsed:.2f}s (with tracemalloc)")
+    print(f"  {'class':24s} {'objects':>9s} {'bytes':>12s} {'bytes/object':>13s}")
+    for name, n in counts.most_common(12):
+        print(f"  {name:24s} {n:9d} {sizes[name]:12d} {sizes[name] / n:13.1f}")
+    print(f"  {'all objects':24s} {sum(counts.values()):9d} {sum(sizes.values()):12d}")
+    print(f"  memory allocated while creating the libraries: {allocated / 2**20:.1f} MiB")
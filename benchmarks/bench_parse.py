@@ -0,0 +1,53 @@
+"""
+Benchmark the parsing of the yaml models, with the pure Python loader versus the libyaml loader.
+
+Run it from the root of the repository:
+
+    $ python3 benchmarks/bench_parse.py [-i ./models/in] [-n 3]
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import yaml
+import onto
+from util import imports
+from util.context import BuildContext
+
+
+def parse_all(loader, load_order: list[Path]) -> float:
+    """Parse all files with the given loader, and return the elapsed time."""
+    context = BuildContext()
+    with context.active():
+        t_start = time.perf_counter()
+        for input_fp in load_order:
+            yaml.load(input_fp.read_bytes(), Loader=loader)
+            context.imported.append(str(input_fp))
+        return time.perf_counter() - t_start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parsing of the yaml models.")
+    parser.add_argument("-i", dest="INPUTDIR", default='./models/in',
+                        help="The directory to read the yaml input files from.")
+    parser.add_argument("-n", dest="REPEAT", type=int, default=3,
+                        help="The number of repetitions (the best one is reported).")
+    args = parser.parse_args()
+
+    graph = imports.build_graph(sorted(Path(args.INPUTDIR).rglob('*.yaml')))
+    load_order = imports.topological_order(graph)
+    n_lines = sum(len(fp.read_bytes().splitlines()) for fp in load_order)
+    print(f"Parsing {len(load_order)} files ({n_lines} lines), best of {args.REPEAT}:")
+
+    loaders = { "pure Python (SafeLoader)": onto.make_loader(yaml.SafeLoader),
+                f"onto ({onto.OntoLoader.__name__})": onto.OntoLoader }
+    results = {}
+    for name, loader in loaders.items():
+        results[name] = min(parse_all(loader, load_order) for _ in range(args.REPEAT))
+        print(f"  {name:32s} {results[name]:7.3f}s")
+
+    slowest = max(results.values())
+    fastest = min(results.values())
+    print(f"  speedup: {slowest / fastest:.1f}x")
@@ -0,0 +1,89 @@
+"""
+Benchmark the rendering of a model, with the path resolution of the old engine versus the current one.
+
+The old engine formatted the full diagnostics of every miss (i.e. whenever a destination wasn't
+found under one of the heads of the scope, even if it was found under the next head), and resolved
+every reference again. This is emulated by patching the resolver used by the templates.
+
+Run it from the root of the repository:
+
+    $ python3 benchmarks/bench_render.py [-i ./models/in/mercator/mtcs_axes.yaml] [-n 3]
+"""
+
+import argparse, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import onto
+from util import imports, logger
+from util.context import BuildContext, current
+from util.paths import PathNotFound, PathResolver
+
+
+def eager_path_to(dest, head):
+    """Like PathResolver.path_to, but format the diagnostics of every miss (like the old engine)."""
+    paths = current().paths
+    path = PathResolver.path_to(paths, dest, head)
+    if path is None:
+        str(PathNotFound(dest, head, paths.chain(head)))
+    return path
+
+
+def uncached_resolve(dest, scope):
+    """Like PathResolver.resolve, but without caching the results."""
+    return current().paths._resolve(dest, scope)
+
+
+VARIANTS = {
+    "eager diagnostics, not cached": { "path_to": eager_path_to, "resolve": uncached_resolve },
+    "lazy diagnostics, not cached": { "resolve": uncached_resolve },
+    "lazy diagnostics, cached": {},
+}
+
+
+def render_time(lib, template_fp: Path, variant: dict) -> float:
+    """Render the library with the given variant of the resolver, and return the elapsed time."""
+    paths = lib.context.paths
+    paths.clear()
+    paths.__dict__.update(variant)
+    try:
+        with lib.context.active():
+            t_start = time.perf_counter()
+            onto.TEMPLATES.render(template_fp, lib=lib)
+            return time.perf_counter() - t_start
+    finally:
+        for name in variant:
+            del paths.__dict__[name]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rendering of a model.")
+    parser.add_argument("-i", dest="INPUTFILE", default='./models/in/mercator/mtcs_axes.yaml',
+                        help="The yaml input file to render.")
+    parser.add_argument("-t", dest="TEMPLATE", default='./templates/{filepath}.xml.mako',
+                        help="The template to render.")
+    parser.add_argument("-n", dest="REPEAT", type=int, default=3,
+                        help="The number of repetitions (the best one is reported).")
+    args = parser.parse_args()
+    logger.setLevel("WARNING")
+
+    input_fp = imports.normalize(args.INPUTFILE)
+    load_order = imports.topological_order(imports.build_graph([input_fp]))
+    lib = None
+    with BuildContext().active():
+        for fp in load_order:
+            lib = onto.build(onto.load(fp))
+
+    template_fp = Path(args.TEMPLATE)
+    onto.TEMPLATES.get(template_fp)
+    print(f"Rendering {input_fp} with {template_fp}, best of {args.REPEAT}:")
+
+    results = {}
+    for name, variant in VARIANTS.items():
+        results[name] = min(render_time(lib, template_fp, variant) for _ in range(args.REPEAT))
+        print(f"  {name:32s} {results[name]:7.3f}s")
+
+    slowest = max(results.values())
+    fastest = min(results.values())
+    print(f"  speedup: {slowest / fastest:.1f}x")
@@ -1,109 +1,664 @@
-import argparse, os, sys, fnmatch, glob, os, pathlib, time
+import argparse, hashlib, io, os, re, sys, fnmatch, glob, os, pathlib, time, multiprocessing, tempfile
+from itertools import zip_longest
 from mako.template import Template
 from mako.lookup import TemplateLookup
+from mako.runtime import Context
 
 from mako import exceptions
 from pathlib import Path
 import yaml
 try:
-    from yaml import CLoader as Loader, CDumper as Dumper
+    from yaml import CLoader as Loader, CDumper as Dumper, CSafeLoader as SafeLoader
 except ImportError:
-    from yaml import Loader, Dumper
-from util import expressions, mathematics, factories
-from util.logger import info, debug, error, setLevel
+    from yaml import Loader, Dumper, SafeLoader
+from util import expressions, mathematics, factories, imports, plcopen
+from util.cache import ModelCache, source_digest
+from util.fragments import FragmentCache, salt
+from util.manifest import Manifest
+from util.profiler import PROFILER, PROFILE_NAME, phase, peak_rss
+from util.context import BuildContext, current
+from util.logger import info, debug, error, setLevel, getLevel, record, replay
 import logging
 
 
-class ImportNeeded(Exception):
-    def __init__(self, name) -> None:
-        super().__init__()
-        self.name = name
+# the version of onto
+VERSION = "0.0.1"
 
+def IMPORT_constructor(loader: Loader, node):
+    filename = str(imports.normalize(loader.construct_scalar(node)))
+    if filename not in current().imported:
+        raise Exception(f"{filename} is imported but was not loaded yet! Is it missing in the import graph?")
 
-IMPORTED = []
 
-def IMPORT_constructor(loader: Loader, node):
-    filename = str(Path(loader.construct_scalar(node)))
-    if filename in IMPORTED:
-        return
-    else:
-        raise ImportNeeded(filename)
 
+# all tags that can be used in the yaml models, and their constructors
+CONSTRUCTORS = {
+    '!IMPORT'                         : IMPORT_constructor,
+    '!ASSIGN'                         : expressions.ASSIGN_constructor,
+    '!ADR'                            : expressions.ADR_constructor,
+    '!SUM'                            : mathematics.SUM_constructor,
+    '!SUB'                            : mathematics.SUB_constructor,
+    '!MUL'                            : mathematics.MUL_constructor,
+    '!DIV'                            : mathematics.DIV_constructor,
+    '!ABS'                            : mathematics.ABS_constructor,
+    '!NEG'                            : mathematics.NEG_constructor,
+    '!DOUBLE'                         : expressions.Double_constructor,
+    '!BOOL'                           : expressions.Bool_constructor,
+    '!UINT8'                          : expressions.UInt8_constructor,
+    '!INT16'                          : expressions.Int16_constructor,
+    '!UINT16'                         : expressions.UInt16_constructor,
+    '!STRING'                         : expressions.String_constructor,
+    '!LIBRARY'                        : factories.LIBRARY_constructor,
+    '!ENUM'                           : factories.ENUM_constructor,
+    '!ENUMERATION'                    : factories.ENUMERATION_constructor,
+    '!STATEMACHINE'                   : factories.STATEMACHINE_constructor,
+    '!STATUS'                         : factories.STATUS_constructor,
+    '!CONFIG'                         : factories.CONFIG_constructor,
+    '!FB'                             : factories.FB_constructor,
+    '!STRUCT'                         : factories.STRUCT_constructor,
+    '!PROCESS'                        : factories.PROCESS_constructor,
+    '!AND'                            : expressions.AND_constructor,
+    '!OR'                             : expressions.OR_constructor,
+    '!NOT'                            : expressions.NOT_constructor,
+    '!EQ'                             : expressions.EQ_constructor,
+    '!GT'                             : expressions.GT_constructor,
+    '!LT'                             : expressions.LT_constructor,
+    '!GE'                             : expressions.GE_constructor,
+    '!LE'                             : expressions.LE_constructor,
+    '!MTCS_SUMMARIZE_BUSY'            : expressions.MTCS_SUMMARIZE_BUSY_constructor,
+    '!MTCS_SUMMARIZE_GOOD'            : expressions.MTCS_SUMMARIZE_GOOD_constructor,
+    '!MTCS_SUMMARIZE_WARN'            : expressions.MTCS_SUMMARIZE_WARN_constructor,
+    '!MTCS_SUMMARIZE_GOOD_OR_DISABLED': expressions.MTCS_SUMMARIZE_GOOD_OR_DISABLED_constructor,
+}
+
+
+def make_loader(base):
+    """Return a subclass of the given yaml loader class, holding all onto tag constructors."""
+    loader = type(f"Onto{base.__name__}", (base,), {})
+    # add_constructor() copies the constructors of the base class on first use,
+    # so the (global) base loader class is not modified
+    for tag, constructor in CONSTRUCTORS.items():
+        loader.add_constructor(tag, constructor)
+    return loader
+
+
+# the yaml loader used to parse the models (backed by libyaml if it's available)
+OntoLoader = make_loader(SafeLoader)
 
 
 def get_loader():
     """Return a yaml loader."""
-    loader = yaml.SafeLoader
-    loader.add_constructor('!IMPORT', IMPORT_constructor)
-    loader.add_constructor('!ASSIGN', expressions.ASSIGN_constructor)
-    loader.add_constructor('!ADR', expressions.ADR_constructor)
-    loader.add_constructor('!SUM', mathematics.SUM_constructor)
-    loader.add_constructor('!SUB', mathematics.SUB_constructor)
-    loader.add_constructor('!MUL', mathematics.MUL_constructor)
-    loader.add_constructor('!DIV', mathematics.DIV_constructor)
-    loader.add_constructor('!ABS', mathematics.ABS_constructor)
-    loader.add_constructor('!NEG', mathematics.NEG_constructor)
-    loader.add_constructor('!DOUBLE', expressions.Double_constructor)
-    loader.add_constructor('!BOOL', expressions.Bool_constructor)
-    loader.add_constructor('!UINT8', expressions.UInt8_constructor)
-    loader.add_constructor('!INT16', expressions.Int16_constructor)
-    loader.add_constructor('!UINT16', expressions.UInt16_constructor)
-    loader.add_constructor('!STRING', expressions.String_constructor)
-    loader.add_constructor('!LIBRARY', factories.LIBRARY_constructor)
-    loader.add_constructor('!ENUM', factories.ENUM_constructor)
-    loader.add_constructor('!ENUMERATION', factories.ENUMERATION_constructor)
-    loader.add_constructor('!STATEMACHINE', factories.STATEMACHINE_constructor)
-    loader.add_constructor('!STATUS', factories.STATUS_constructor)
-    loader.add_constructor('!CONFIG', factories.CONFIG_constructor)
-    loader.add_constructor('!FB', factories.FB_constructor)
-    loader.add_constructor('!STRUCT', factories.STRUCT_constructor)
-    loader.add_constructor('!PROCESS', factories.PROCESS_constructor)
-    loader.add_constructor('!AND', expressions.AND_constructor)
-    loader.add_constructor('!OR', expressions.OR_constructor)
-    loader.add_constructor('!NOT', expressions.NOT_constructor)
-    loader.add_constructor('!EQ', expressions.EQ_constructor)
-    loader.add_constructor('!GT', expressions.GT_constructor)
-    loader.add_constructor('!LT', expressions.LT_constructor)
-    loader.add_constructor('!GE', expressions.GE_constructor)
-    loader.add_constructor('!LE', expressions.LE_constructor)
-    loader.add_constructor('!MTCS_SUMMARIZE_BUSY', expressions.MTCS_SUMMARIZE_BUSY_constructor)
-    loader.add_constructor('!MTCS_SUMMARIZE_GOOD', expressions.MTCS_SUMMARIZE_GOOD_constructor)
-    loader.add_constructor('!MTCS_SUMMARIZE_WARN', expressions.MTCS_SUMMARIZE_WARN_constructor)
-    loader.add_constructor('!MTCS_SUMMARIZE_GOOD_OR_DISABLED', expressions.MTCS_SUMMARIZE_GOOD_OR_DISABLED_constructor)
-    return loader
+    return OntoLoader
+
+
+def load(input_file: Path, cache: ModelCache = None) -> dict:
+    """Parse a yaml file (or get it from the cache). All files it imports must have been loaded before."""
+    info(f"Loading {input_file}")
+    current().parsed[input_file] += 1
+    content = input_file.read_bytes()
+    model = None
+    with phase("parse"):
+        if cache is not None:
+            model = cache.load(input_file, content)
+        if model is None:
+            model = yaml.load(content, Loader=get_loader())
+            if cache is not None:
+                cache.store(input_file, content, model)
+    current().imported.append(str(input_file))
+    debug("Imported: %s", current().imported)
+    return model
+
+
+class Templates:
+    """
+    The templates, compiled at most once per process.
+
+    The compile and render times are measured per process too, so they include the time of
+    all builds that run concurrently in this process.
+
+    Optionally, the compiled templates are also cached as python modules on disk, so they
+    don't need to be compiled again by the next process.
+
+    With the "native" backend, the templates that have a native emitter (see util/plcopen.py)
+    are not rendered by Mako, but by that emitter (which writes the same output).
+    """
 
+    def __init__(self, module_directory: Path = None, backend: str = "mako") -> None:
+        self.lookup = TemplateLookup(directories=[""], module_directory=module_directory)
+        self.backend = backend
+        self.compile_time = 0.0
+        self.render_time = 0.0
 
-def render(input_file: Path, template_fps: list[Path]) -> str:
+    def get(self, template_fp: Path) -> Template:
+        """Return the compiled template."""
+        t_start = time.perf_counter()
+        with phase("compile"):
+            template = self.lookup.get_template(template_fp.as_posix())
+        self.compile_time += time.perf_counter() - t_start
+        return template
+
+    def compile_all(self, templatedir_fp: Path):
+        """Compile all templates, including the ones that are only used as namespaces."""
+        for template_fp in sorted(templatedir_fp.rglob('*.mako')):
+            self.get(template_fp)
+
+    def render(self, template_fp: Path, **kwargs) -> str:
+        """Render a template with the given arguments, and return the output."""
+        buffer = io.StringIO()
+        self.render_to(template_fp, buffer, **kwargs)
+        return buffer.getvalue()
+
+    def render_to(self, template_fp: Path, file, **kwargs):
+        """Render a template with the given arguments, writing the output to a (text) file as it goes."""
+        if self.backend == "native" and template_fp.name in plcopen.TEMPLATES:
+            template = None
+        else:
+            template = self.get(template_fp)
+        t_start = time.perf_counter()
+        with phase("render"):
+            if template is None:
+                plcopen.emit(kwargs["lib"], file, kwargs.get("fragments"))
+            else:
+                template.render_context(Context(file, **kwargs))
+        self.render_time += time.perf_counter() - t_start
+
+    def report(self):
+        info("Templates were compiled in %.2fs and rendered in %.2fs" % (self.compile_time, self.render_time))
+
+
+# the templates used by this process
+TEMPLATES = Templates()
+
+def use_template_cache(cache: ModelCache):
+    """Cache the compiled templates in the same directory as the models."""
+    global TEMPLATES
+    TEMPLATES = Templates(module_directory=cache.directory / "templates", backend=TEMPLATES.backend)
+
+
+def output_path(input_file: Path, template_fp: Path, inputdir_fp: Path, outputdir_fp: Path) -> Path:
+    """Return the path of the file that is rendered from the given input file and template."""
+    filepath_key = str(input_file).replace('.yaml', '').replace(str(inputdir_fp), '')
+    return outputdir_fp \
+           / Path('./' + str(template_fp)[len('templates/'):-len('.mako')] \
+               .replace('{filepath}', filepath_key))
+
+
+def fragment_cache(cache: ModelCache, template_fp: Path, output_fp: Path) -> FragmentCache:
+    """Return the cache of the rendered fragments of an output file (stored in the same directory as the models)."""
+    key = hashlib.sha256(str(output_fp).encode()).hexdigest()
+    return FragmentCache(cache.directory / "fragments" / f"{key}.pickle", salt(cache.version, template_fp))
+
+
+def render(input_file: Path, lib: factories.Library, template_fps: list[Path],
+           inputdir_fp: Path, outputdir_fp: Path, cache: ModelCache = None) -> list[Path]:
+    """
+    Render the library of a model with the given templates straight to disk, and return the output files.
+
+    If a cache is given, the fragments that didn't change since the previous run are copied from it.
+    """
     info(f"Processing {input_file}")
-    model = {}
-    with open(input_file, 'r') as file:
-        
+    outputs = []
+    if lib is None:
+        info(f"No library is defined in {input_file}, so there's nothing to render")
+        return outputs
+
+    for template_fp in template_fps:
+        output_fp = output_path(input_file, template_fp, inputdir_fp, outputdir_fp)
+        fragments = None if cache is None else fragment_cache(cache, template_fp, output_fp)
+        # rendering may create objects too (i.e. the copies of the expanded variables)
+        with lib.context.active():
+            render_to_file(template_fp, lib, output_fp, fragments)
+        if fragments is not None:
+            info("Rendered %d fragments of '%s', and copied %d from the cache" %(fragments.misses, output_fp, fragments.hits))
+            fragments.save()
+        outputs.append(output_fp)
+    return outputs
+
+
+# the size of the chunks in which the outputs are written and compared
+CHUNK_SIZE = 1 << 16
+
+
+# a timestamp as written in the outputs (see factories.now())
+TIMESTAMP_PATTERN = re.compile(rb"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?")
+
+
+def is_unchanged(output_fp: Path, new_fp: Path, timestamp: str = None) -> bool:
+    """
+    Check if the output file has the same contents as the new file, line by line.
+
+    The lines that hold the given timestamp in the new file (i.e. the header) also match if the
+    output file has another timestamp there, so an output isn't written again only because it
+    was rendered at another time.
+    """
+    stamp = None if timestamp is None else timestamp.encode()
+    try:
+        with open(output_fp, 'rb', buffering=CHUNK_SIZE) as old_file, \
+             open(new_fp, 'rb', buffering=CHUNK_SIZE) as new_file:
+            for old_line, new_line in zip_longest(old_file, new_file):
+                if old_line == new_line:
+                    continue
+                if stamp is None or old_line is None or new_line is None or stamp not in new_line:
+                    return False
+                if TIMESTAMP_PATTERN.sub(b"", old_line) != new_line.replace(stamp, b""):
+                    return False
+            return True
+    except OSError:
+        return False
+
+
+def file_mode(output_fp: Path) -> int:
+    """Return the permissions of an output file: the ones of the existing file, or else the default ones."""
+    if output_fp.exists():
+        return output_fp.stat().st_mode & 0o777
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def render_to_file(template_fp: Path, lib: factories.Library, output_fp: Path, fragments: FragmentCache = None):
+    """
+    Render a template via a temporary file in the same directory as the output file, which is then renamed.
+
+    The output is written in chunks while it's being rendered, so it's never held in memory as a whole.
+    Readers (and a crash or Ctrl-C halfway) either see the old file, or the new one. An unchanged output
+    file (ignoring its timestamp) is left untouched.
+    """
+    output_fp.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=output_fp.parent, prefix=f".{output_fp.name}.", suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8', newline='', buffering=CHUNK_SIZE) as file:
+            TEMPLATES.render_to(template_fp, file, lib=lib, fragments=fragments)
+        with phase("write"):
+            if is_unchanged(output_fp, Path(tmp), lib.context.timestamp):
+                info("Output file '%s' is unchanged" %output_fp)
+                os.unlink(tmp)
+                return
+            info("Writing output file '%s'" %output_fp)
+            os.chmod(tmp, file_mode(output_fp))
+            os.replace(tmp, output_fp)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def build(model: dict) -> factories.Library | None:
+    """
+    Create the libraries of a model, and return the first one (which is the one to render).
+
+    The libraries are created once per model, and then shared by all templates.
+    """
+    libs = []
+    context = current()
+    # the cached paths refer to the objects of the previous libraries
+    context.paths.clear()
+    if model:
+        with phase("create"):
+            for item_k, item_v in model.items():
+                if isinstance(item_k, factories.LIBRARY):
+                    libs.append(factories.Library(item_k.name, item_v, context))
+    return libs[0] if len(libs) > 0 else None
+
+
+class Selection:
+    """
+    The models and templates to render, selected by globs (see --only, --exclude, --only-template
+    and --exclude-template).
+
+    A glob matches a file if it matches its name with or without the extension(s), or its path
+    relative to the input directory (for the models) or the templates directory (for the templates).
+    """
+
+    def __init__(self, only: list[str] = [], exclude: list[str] = [],
+                 only_templates: list[str] = [], exclude_templates: list[str] = []) -> None:
+        self.only = only
+        self.exclude = exclude
+        self.only_templates = only_templates
+        self.exclude_templates = exclude_templates
+
+    @staticmethod
+    def matches(fp: Path, base_fp: Path, only: list[str], exclude: list[str]) -> bool:
+        """Check if the file matches any of the "only" globs (if there are any), and none of the "exclude" globs."""
+        names = [fp.name, fp.name.split('.')[0], fp.relative_to(base_fp).as_posix()]
+        def match(patterns):
+            return any(fnmatch.fnmatchcase(name, pattern) for name in names for pattern in patterns)
+        return (len(only) == 0 or match(only)) and not match(exclude)
+
+    def model(self, input_fp: Path, inputdir_fp: Path) -> bool:
+        return self.matches(input_fp, inputdir_fp, self.only, self.exclude)
+
+    def template(self, template_fp: Path) -> bool:
+        return self.matches(template_fp, Path('./templates'), self.only_templates, self.exclude_templates)
+
+
+def find_templates() -> list[Path]:
+    """Return the templates to render (templates starting with an underscore are skipped)."""
+    template_fps = []
+    for template_fp in Path('./templates').rglob('*.mako'):
+        if not template_fp.stem.startswith('_'):
+            template_fps.append(template_fp)
+    return template_fps
+
+
+def plan(load_order: list[Path], graph: dict[Path, list[Path]], template_fps: list[Path],
+         inputdir_fp: Path, outputdir_fp: Path, manifest: Manifest, force: bool,
+         selected: set[Path]) -> dict[Path, list[Path]]:
+    """
+    Return the templates that must be rendered for each input file, and report why.
+
+    Only the selected input files are rendered. The others are only loaded as imports.
+    """
+    todo = {}
+    for input_fp in load_order:
+        todo[input_fp] = []
+        if input_fp not in selected:
+            debug("Not rendering %s: it is only loaded as an import", input_fp)
+            continue
+        import_fps = imports.transitive_imports(graph, input_fp)
+        for template_fp in template_fps:
+            output_fp = output_path(input_fp, template_fp, inputdir_fp, outputdir_fp)
+            if force:
+                reason = "a rebuild was forced"
+            else:
+                reason = manifest.check(output_fp, input_fp, import_fps, template_fp)
+            if reason is None:
+                info(f"Skipping '{output_fp}': it is up to date")
+            else:
+                info(f"Rebuilding '{output_fp}': {reason}")
+                todo[input_fp].append(template_fp)
+    return todo
+
+
+def record_outputs(manifest: Manifest, input_fp: Path, outputs: list[Path], graph: dict[Path, list[Path]],
+                   template_fps: list[Path], inputdir_fp: Path, outputdir_fp: Path):
+    """Record the written outputs of an input file in the manifest."""
+    import_fps = imports.transitive_imports(graph, input_fp)
+    for template_fp in template_fps:
+        output_fp = output_path(input_fp, template_fp, inputdir_fp, outputdir_fp)
+        if output_fp in outputs:
+            manifest.update(output_fp, input_fp, import_fps, template_fp)
+
+
+class Worker:
+    """
+    The state of a worker process, which renders one model after the other (see render_in_parallel()).
+
+    The templates are compiled once per worker, and the models it built are kept in its build
+    context, so the imports shared by the models it renders (like mtcs_common) are only loaded
+    once per worker. The worker writes the output files itself.
+    """
+
+    def __init__(self, cachedir: str, level: int, timestamp: str, profile: bool, backend: str) -> None:
+        self.recorder = record()
+        setLevel(level)
+        PROFILER.enabled = profile
+        # use the same timestamp as the main process, so the output is identical to a serial run
+        self.timestamp = timestamp
+        self.cache = None
+        if cachedir is not None:
+            self.cache = ModelCache(cachedir, VERSION, sources=[Path(__file__)])
+            use_template_cache(self.cache)
+        TEMPLATES.backend = backend
+        self.compiled = False
+        self.reset()
+
+    def reset(self):
+        """Start over with a new build context (e.g. after a model failed, which may have left it half built)."""
+        self.context = BuildContext(self.timestamp)
+        self.context.fingerprint_items = self.cache is not None
+        # the libraries built by this worker so far, per input file
+        self.built = {}
+
+    def build(self, input_fp: Path) -> factories.Library | None:
+        """Return the library of a model, which is only built if this worker didn't build it before."""
+        if input_fp in self.built:
+            debug("Reusing the already loaded model %s", input_fp)
+            self.context.imported.append(str(input_fp))
+        else:
+            self.built[input_fp] = build(load(input_fp, self.cache))
+        return self.built[input_fp]
+
+    def render(self, input_fp: Path, dependencies: list[Path], template_fps: list[Path],
+               inputdir_fp: Path, outputdir_fp: Path):
+        """
+        Load the dependencies of a model (if needed) and render it.
+
+        Returns the input file, the output files, the recorded log records, the error (if any),
+        the profile (if enabled) and the peak memory usage of this worker so far.
+        """
+        self.recorder.records = []
+        TEMPLATES.compile_time = TEMPLATES.render_time = 0.0
+        context = self.context
+        context.start_run()
+        with context.active():
+            try:
+                if not self.compiled:
+                    PROFILER.start("(templates)")
+                    TEMPLATES.compile_all(Path('./templates'))
+                    self.compiled = True
+                # the imports have their own rows in the profile (of the worker that renders them)
+                PROFILER.start(input_fp, imports=True)
+                for dependency in dependencies:
+                    self.build(dependency)
+                PROFILER.start(input_fp)
+                context.created.clear()
+                outputs = render(input_fp, self.build(input_fp), template_fps, inputdir_fp, outputdir_fp, self.cache)
+                PROFILER.count_objects(context.created)
+                context.parsed.check()
+                TEMPLATES.report()
+                failure = None
+            except Exception:
+                outputs = []
+                failure = exceptions.text_error_template().render()
+                self.reset()
+        PROFILER.start(None)
+        profile = PROFILER.models
+        PROFILER.clear()
+        return input_fp, outputs, self.recorder.records, failure, profile, peak_rss()
+
+
+# the state of this process, if it's a worker process
+WORKER = None
+
+def init_worker(*args):
+    global WORKER
+    WORKER = Worker(*args)
+
+def render_in_worker(task):
+    return WORKER.render(*task)
+
+
+def render_in_parallel(load_order: list[Path], graph: dict[Path, list[Path]], todo: dict[Path, list[Path]],
+                       jobs: int, inputdir_fp: Path, outputdir_fp: Path, cachedir: str,
+                       manifest: Manifest) -> bool:
+    """
+    Render the models on a pool of worker processes, and return True if all of them succeeded.
+
+    The models are scheduled in import order, and each one is rendered by a worker that first
+    loads its (transitive) imports, unless that worker loaded them already for a previous model
+    (see Worker). The logs of each model are printed as a single block.
+    """
+    tasks = []
+    for input_fp in load_order:
+        if len(todo[input_fp]) == 0:
+            continue
+        dependencies = imports.transitive_imports(graph, input_fp)
+        tasks.append((input_fp,
+                      [fp for fp in load_order if fp in dependencies],
+                      todo[input_fp],
+                      inputdir_fp, outputdir_fp))
+
+    t_start = time.time()
+    success = True
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(jobs, initializer=init_worker,
+                      initargs=(cachedir, getLevel(), current().timestamp, PROFILER.enabled, TEMPLATES.backend)) as pool:
+        for input_fp, outputs, records, failure, profile, rss in pool.imap_unordered(render_in_worker, tasks):
+            replay(records)
+            PROFILER.merge(profile, rss)
+            PROFILER.start(input_fp)
+            if failure is not None:
+                error(f"Model {input_fp} could not be rendered:\n{failure}")
+                success = False
+                continue
+            record_outputs(manifest, input_fp, outputs, graph, todo[input_fp], inputdir_fp, outputdir_fp)
+            info("Model %s was rendered after %4.1fs" % (input_fp, (time.time() - t_start)))
+    return success
+
+
+def render_sequentially(load_order: list[Path], graph: dict[Path, list[Path]], todo: dict[Path, list[Path]],
+                        inputdir_fp: Path, outputdir_fp: Path, cache: ModelCache, manifest: Manifest,
+                        built: dict[Path, tuple[str, factories.Library]]):
+    """
+    Render the models one after the other, in a single process.
+
+    Models that don't need to be rendered are only loaded if another model imports them.
+    The built dict maps the models that were already loaded in this process (e.g. during a
+    previous run in watch mode) to the hash of their contents and their library. Such models
+    are reused (and rendered again if needed, e.g. after a template changed), unless they or
+    any of their imports changed.
+    """
+    needed = set()
+    for input_fp in load_order:
+        if len(todo[input_fp]) > 0:
+            needed.add(input_fp)
+            needed |= imports.transitive_imports(graph, input_fp)
+
+    context = current()
+    rebuilt = set()
+    t_start = time.time()
+    if len(needed) > 0:
+        PROFILER.start("(templates)")
+        TEMPLATES.compile_all(Path('./templates'))
+    # process each input file sequentially, after all of its imports:
+    for input_fp in load_order:
+        if input_fp not in needed:
+            continue
+
+        PROFILER.start(input_fp)
+        context.created.clear()
+        content_hash = manifest.hash(input_fp)
+        import_fps = imports.transitive_imports(graph, input_fp)
+        if input_fp in built and built[input_fp][0] == content_hash and rebuilt.isdisjoint(import_fps):
+            debug("Reusing the already loaded model %s", input_fp)
+            lib = built[input_fp][1]
+            context.imported.append(str(input_fp))
+        else:
+            info("Processing input file '%s'" %input_fp)
+            built.pop(input_fp, None)
+            rebuilt.add(input_fp)
+            lib = build(load(input_fp, cache))
+            built[input_fp] = (content_hash, lib)
+
+        if len(todo[input_fp]) > 0:
+            outputs = render(input_fp, lib, todo[input_fp], inputdir_fp, outputdir_fp, cache)
+            record_outputs(manifest, input_fp, outputs, graph, todo[input_fp], inputdir_fp, outputdir_fp)
+            info("Model %s was rendered after %4.1fs" % (input_fp, (time.time() - t_start)))
+        # only now, since rendering creates objects too (i.e. the copies of the expanded variables)
+        PROFILER.count_objects(context.created)
+
+    context.parsed.check()
+    info("Parsed %d files, each file exactly once" % len(context.parsed))
+    TEMPLATES.report()
+    if cache is not None:
+        info("Model cache: %d hits, %d misses" % (cache.hits, cache.misses))
+
+
+def run(inputdir_fp: Path, outputdir_fp: Path, cache: ModelCache, jobs: int = 1, force: bool = False,
+        built: dict[Path, tuple[str, factories.Library]] = None, profile_fp: Path = None,
+        context: BuildContext = None, selection: Selection = None) -> bool:
+    """
+    Render all outdated output files once, and return True if all of them succeeded.
+
+    If a selection is given, only the selected models are rendered with the selected templates,
+    and only the files they (transitively) import are loaded too.
+    The models are built in the given context (or in a new one, which is released afterwards).
+    If the profiler is enabled, the profile of this run is reported (and saved to profile_fp).
+    """
+    if context is None:
+        context = BuildContext()
+    context.start_run()
+    if selection is None:
+        selection = Selection()
+    # the items are fingerprinted to cache their rendered fragments (in the cache directory)
+    context.fingerprint_items = cache is not None
+    PROFILER.clear()
+    input_fps = [fp for fp in sorted(inputdir_fp.rglob('*.yaml')) if selection.model(fp, inputdir_fp)]
+    template_fps = [fp for fp in find_templates() if selection.template(fp)]
+    if len(input_fps) == 0 or len(template_fps) == 0:
+        error("No models or no templates are selected, so there's nothing to render")
+        return False
+    # determine the order in which the input files (and the files they import) must be loaded
+    graph = imports.build_graph(input_fps)
+    load_order = imports.topological_order(graph)
+
+    manifest = Manifest(outputdir_fp, source_digest([Path(__file__)]))
+    todo = plan(load_order, graph, template_fps, inputdir_fp, outputdir_fp, manifest, force,
+                set(imports.normalize(fp) for fp in input_fps))
+
+    try:
+        with context.active():
+            if jobs > 1:
+                cachedir = None if cache is None else cache.directory
+                return render_in_parallel(load_order, graph, todo, jobs, inputdir_fp, outputdir_fp, cachedir, manifest)
+            render_sequentially(load_order, graph, todo, inputdir_fp, outputdir_fp, cache, manifest,
+                                {} if built is None else built)
+            return True
+    finally:
+        # also save the manifest if only some of the outputs could be built
+        manifest.save()
+        if PROFILER.enabled:
+            PROFILER.start(None)
+            PROFILER.report(profile_fp)
+
+
+def snapshot(dirs: list[Path]) -> dict[Path, tuple]:
+    """Return the modification time and size of all files in the given directories."""
+    state = {}
+    for d in dirs:
+        for fp in d.rglob('*'):
+            if fp.is_file():
+                stat = fp.stat()
+                state[fp] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def watch(inputdir_fp: Path, outputdir_fp: Path, cache: ModelCache, interval: float, profile_fp: Path = None,
+          selection: Selection = None):
+    """
+    Keep rendering the outdated output files whenever the models or the templates change.
+
+    The models that are not affected by a change are loaded only once, and are reused by the
+    following runs (so all runs share the same build context, see BuildContext.start_run()).
+    Changes to the onto sources themselves require a restart. A model or template that cannot
+    be rendered (also at startup) is reported, and rendered again once it changes.
+    """
+    dirs = [inputdir_fp, Path('./templates')]
+    built = {}
+    context = BuildContext()
+
+    def rebuild():
         try:
-            model = yaml.load(file, Loader=get_loader())
-            global IMPORTED
-            IMPORTED.append(str(input_file))
-            debug(f"Imported: {str(IMPORTED)}")
-        except ImportNeeded as e:
-            render(Path(e.name), template_fps)
-            render(input_file, template_fps)
-            
-        if len(model) > 0: # TODO: find out why sometimes the yaml load returns empty models
-            debug(f"Model: {model} from file: {file}")
-
-            for template_fp in template_fps:
-                template = Template(filename=str(template_fp), 
-                                    lookup=TemplateLookup(directories=""))
-                output = template.render(M=model)
-                
-                filepath_key = str(input_fp).replace('.yaml', '').replace(str(inputdir_fp), '')
-
-                output_fp = Path(args.OUTPUTDIR) \
-                            / Path('./' + str(template_fp)[len('templates/'):-len('.mako')] \
-                                .replace('{filepath}', filepath_key))
-
-                output_fp.parent.mkdir(parents=True, exist_ok=True)
-                info("Writing output file '%s'" %output_fp)
-                output_fp.write_text(output, newline='\n')
+            run(inputdir_fp, outputdir_fp, cache, built=built, profile_fp=profile_fp, context=context,
+                selection=selection)
+        except Exception:
+            error(exceptions.text_error_template().render())
+
+    state = snapshot(dirs)
+    rebuild()
+    info(f"Watching {', '.join(str(d) for d in dirs)} for changes (press Ctrl-C to stop)")
+    while True:
+        time.sleep(interval)
+        new_state = snapshot(dirs)
+        if new_state == state:
+            continue
+        changed = sorted(str(fp) for fp in set(state) | set(new_state) if state.get(fp) != new_state.get(fp))
+        state = new_state
+        info(f"Detected changes in {', '.join(changed)}")
+        t_start = time.time()
+        context.timestamp = factories.now()
+        rebuild()
+        info("Processed the changes in %.2fs" % (time.time() - t_start))
 
 
 # a function that returns the script description as a string
@@ -145,6 +700,99 @@ if __name__ == "__main__":
                         default=False, 
                         help="Verbosely print some debugging info.")
     
+    parser.add_argument("--cache",
+                        dest="CACHEDIR",
+                        action="store",
+                        default=None,
+                        help="A directory to cache the parsed yaml models, the compiled templates " \
+                             "and the rendered fragments (<pou> and <dataType> elements) in. Unchanged " \
+                             "models are then loaded from the cache instead of being parsed again, " \
+                             "unchanged templates are not compiled again, and unchanged fragments are " \
+                             "not rendered again. By default no cache is used.")
+    
+    parser.add_argument("-j", "--jobs",
+                        dest="jobs",
+                        action="store",
+                        type=int,
+                        default=1,
+                        help="The number of models to render in parallel (on as many worker " \
+                             "processes). By default the models are rendered sequentially.")
+    
+    parser.add_argument("-f", "--force",
+                        dest="force",
+                        action="store_const",
+                        const=True,
+                        default=False,
+                        help="Rebuild all output files, even the ones that are up to date " \
+                             "according to the manifest in the output directory.")
+    
+    parser.add_argument("-w", "--watch",
+                        dest="watch",
+                        action="store_const",
+                        const=True,
+                        default=False,
+                        help="Keep running, and render the affected output files whenever the " \
+                             "models or the templates change. Unaffected models are loaded only once.")
+    
+    parser.add_argument("--profile",
+                        dest="PROFILE",
+                        nargs="?",
+                        const=PROFILE_NAME,
+                        default=None,
+                        help="Report the time spent per model in each phase (parse, create, resolve, " \
+                             "compile, render, write), the number of created objects and the peak " \
+                             "memory usage. The report is also saved as json to the given file " \
+                             f"(by default {PROFILE_NAME} in the output directory).")
+
+    parser.add_argument("--backend",
+                        dest="backend",
+                        action="store",
+                        choices=["mako", "native"],
+                        default="mako",
+                        help="How to render the PLCopen XML files: with the Mako templates, or with " \
+                             "the native emitter (which writes the same output, but faster). " \
+                             "Other templates are always rendered with Mako. By default Mako is used.")
+
+    parser.add_argument("--only",
+                        dest="only",
+                        action="append",
+                        default=[],
+                        metavar="GLOB",
+                        help="Only render the models that match the glob (e.g. mtcs_m3, or mercator/mtcs_m*). " \
+                             "The glob is matched against the file name, with or without extension, and against " \
+                             "the path relative to the input directory. The files that these models import are " \
+                             "still loaded, but not rendered. Can be given more than once.")
+
+    parser.add_argument("--exclude",
+                        dest="exclude",
+                        action="append",
+                        default=[],
+                        metavar="GLOB",
+                        help="Don't render the models that match the glob (like --only). Can be given more than once.")
+
+    parser.add_argument("--only-template",
+                        dest="only_templates",
+                        action="append",
+                        default=[],
+                        metavar="GLOB",
+                        help="Only render the templates that match the glob (e.g. '*.xml.mako'), matched like " \
+                             "--only but relative to the templates directory. Can be given more than once.")
+
+    parser.add_argument("--exclude-template",
+                        dest="exclude_templates",
+                        action="append",
+                        default=[],
+                        metavar="GLOB",
+                        help="Don't render the templates that match the glob (like --only-template). " \
+                             "Can be given more than once.")
+
+    parser.add_argument("--interval",
+                        dest="interval",
+                        action="store",
+                        type=float,
+                        default=1.0,
+                        help="The number of seconds between two checks for changes in watch mode.")
+    
     args = parser.parse_args()
     
     if args.verbose:
@@ -163,17 +811,29 @@ if __name__ == "__main__":
         error(f"FATAL: Input directory {args.INPUTDIR} does not exist!")
         sys.exit(1)
     
-    t_start = time.time()
-    # process each input file sequentially:
-    for input_fp in inputdir_fp.rglob('*.yaml'):
-        
-        info("Processing input file '%s'" %input_fp)
-        
-        template_fps = []
-        for template_fp in Path('./templates').rglob('*.mako'):
-            if not template_fp.stem.startswith('_'):
-                template_fps.append(template_fp)
-
-        render(input_fp, template_fps)
-        info("Model %s was rendered after %4.1fs" % (input_fp, (time.time() - t_start)))
-                
+    outputdir_fp = Path(args.OUTPUTDIR)
+
+    cache = None
+    if args.CACHEDIR is not None:
+        cache = ModelCache(args.CACHEDIR, VERSION, sources=[Path(__file__)])
+        use_template_cache(cache)
+    TEMPLATES.backend = args.backend
+
+    profile_fp = None
+    if args.PROFILE is not None:
+        PROFILER.enabled = True
+        profile_fp = outputdir_fp / PROFILE_NAME if args.PROFILE == PROFILE_NAME else Path(args.PROFILE)
+
+    selection = Selection(args.only, args.exclude, args.only_templates, args.exclude_templates)
+
+    try:
+        if args.watch:
+            watch(inputdir_fp, outputdir_fp, cache, args.interval, profile_fp, selection)
+        elif not run(inputdir_fp, outputdir_fp, cache, jobs=args.jobs, force=args.force, profile_fp=profile_fp,
+                     selection=selection):
+            sys.exit(1)
+    except imports.ImportCycleError as e:
+        error(f"FATAL: {e}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        info("Stopped")
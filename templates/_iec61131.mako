@@ -1,10 +1,11 @@
 <%namespace name="iec61131" file="_iec61131.mako"/>\
 <%! 
-    import pprint
-    from util.expressions import IfThen, BinaryOperation, UnaryOperation, Primitive, Bool, String
+    from util.expressions import IfThen, BinaryOperation, NaryOperation, UnaryOperation, Primitive, Bool, String
     from util.factories import Variable, Method, Call, EnumItem, FunctionBlock, GlobalVariable
     from xml.sax.saxutils import escape as sax_escape
-    from util.logger import debug, info
+    from util.logger import debug, debugging, info
+    from util.profiler import profiled
+    from util.context import current
 
     def escape(s):
         return sax_escape(s, entities={
@@ -14,100 +15,9 @@
             ">": "&gt;"
         })
 
+    @profiled("resolve")
     def getPrefixAndPath(dest, scope = []):
-        #debug(f" --- getPrefixAndPath({dest.name})")
-        e = None
-        for head in scope:
-            if isinstance(dest, EnumItem):
-                return None, [ dest.parent, dest ]
-
-            if hasattr(head, "extends") and hasattr(dest, "points_to_type"):
-
-                if head.extends is not None and dest.points_to_type is not None:
-                    if head.extends.name == dest.points_to_type.name:
-                        return "SUPER", []
-
-            try:
-                if isinstance(head, FunctionBlock):
-                    ## only explicitely mention THIS^ if there can be confusion (i.e. when the scope is > 1)
-                    if len(scope) > 1:
-                        return "THIS^", getPathToSubVariable(dest, head)
-                    else:
-                        return None, getPathToSubVariable(dest, head)
-                elif isinstance(head, Method):
-                    ## within the scope of a IEC61131-3 Method, the method itself is reachable via the method name
-                    if id(dest) == id(head):
-                        return dest.name, []
-                    else:
-                        return None, getPathToSubVariable(dest, head)
-
-            except EOFError as eof:
-                e = eof
-
-        if e is not None:
-            raise e
-
-    def getPathToSubVariable(dest, head):
-
-        if isinstance(dest, GlobalVariable):
-            return [dest]
-
-        # below is a hack-ish way to determine if dest and type are the same object
-        # We cannot compare the ids (id(<obj>)), nor say "if dest is head" because of some intricacies of
-        # cpython object management
-        # So we have to compare some attributes to determine weather or not the 2 objects are the same
-        if dest.name == head.name and type(dest) == type(head) and dest.parent.name == head.parent.name:
-            return []
-
-        if dest.parent is None:
-            raise EOFError()
-
-        p = None
-
-        # check parent of superclasses too!
-        all_heads = []
-
-        try:
-
-            def get_heads_recursively(head):
-                ret = [head]
-                if hasattr(head, 'extends'):
-                    if head.extends is not None:
-                        ret += get_heads_recursively(head.extends)
-                return ret
-
-            all_heads = get_heads_recursively(head)
-
-            for any_head in all_heads:
-                try:
-                    p = getPathToSubVariable(dest.parent, any_head) + [ dest ]
-                    break
-                except EOFError:
-                    pass
-
-        except EOFError:
-            pass
-
-        if p is not None:
-            return p
-
-        if 'parent' in dest.__dict__:
-            dest_parent = dest.__dict__['parent'].name
-        else:
-            dest_parent = ''
-
-        raise EOFError( "Destination %s (%s) (ID %x) was not found as a subvariable of %s (%s)" %(dest.name, type(dest).__name__, id(dest), head.name, type(head).__name__)
-                        + "\n\n"
-                        + "Destination " + dest.name + " (child of parent " + dest_parent + ") ID=" + ("%x" % id(dest)) +  " :\n"
-                        + pprint.pformat(dest.__dict__)
-                        + "\n\n"
-                        + "Destination parent:\n"
-                        + pprint.pformat(dest.parent.__dict__)
-                        + "\n\n"
-                        + "Head " + head.name + (" ID=%x " % id(head)) + ":\n"
-                        + pprint.pformat(head.__dict__)
-                        + "\n\n"
-                        + str(all_heads))
+        return current().paths.resolve(dest, scope)
 
 
 %>\
@@ -146,16 +56,16 @@
     lib.get_structs(recursive=True, structs=structs) 
 %>\
     % for enum in enums:
-      ${xml_enum(enum, '      ')}
+      ${xml_fragment(xml_enum, enum, '      ')}
     % endfor
     % for struct in structs:
-      ${xml_struct(struct, '      ')}
+      ${xml_fragment(xml_struct, struct, '      ')}
     % endfor
     </dataTypes>
     <pous>
     % for fb in fbs:
       % if fb.render:
-      ${xml_pou_functionBlock(fb, '      ')}
+      ${xml_fragment(xml_pou_functionBlock, fb, '      ')}
       % endif
     % endfor
     </pous>
@@ -166,13 +76,23 @@
   <addData>
     <data name="http://www.3s-software.com/plcopenxml/projectstructure" handleUnknown="discard">
       <ProjectStructure>
-        ${xml_folder(lib, [], '        ')}
+        ${xml_folder(lib, set(), '        ')}
       </ProjectStructure>
     </data>
   </addData>
 </project>\
 </%def>
 
+## render a <dataType> or <pou>, or copy it from the fragments of the previous run if it didn't change
+<%def name="xml_fragment(render, node, indent='')">\
+<% fragments = context.get('fragments') %>\
+% if fragments is None:
+${render(node, indent)}\
+% else:
+${fragments.get(node, indent, lambda: capture(render, node, indent))}\
+% endif
+</%def>
+
 <%def name="xml_folder(node, already_rendered, indent='')">\
 <%
     namespaces = []
@@ -193,13 +113,13 @@
   % for namespace in namespaces:
     % if namespace not in already_rendered:
 ${indent}  ${xml_folder(namespace, already_rendered, indent+'  ')}
-<% already_rendered.append(namespace) %>\
+<% already_rendered.add(namespace) %>\
     % endif
   % endfor
   % for type in types:
     % if type not in already_rendered:
 ${indent}  ${xml_object(type, indent+'  ')}
-<% already_rendered.append(type) %>\
+<% already_rendered.add(type) %>\
     % endif
   % endfor
 ${indent}</Folder>\
@@ -281,7 +201,7 @@ ${xml_method(method, owner, indent)}\
 </%def>
 
 <%def name="xml_method(node, owner, indent='')">\
-<% debug(f"xml_method({node.name})") %>\
+<% debug("xml_method(%s)", node.name) %>\
 <data name="http://www.3s-software.com/plcopenxml/method" handleUnknown="implementation">
 ${indent}  <Method name="${node.name}">
 ${indent}    <interface>
@@ -313,7 +233,7 @@ ${indent}</data>\
 </%def>
 
 <%def name="xml_return_type(node)">\
-<% debug(f"xml_return_type({node.name})") %>\
+<% debug("xml_return_type(%s)", node.name) %>\
 <returnType>${xml_type_element(node)}</returnType>\
 </%def>
 
@@ -354,7 +274,7 @@ ${indent}</${kind}Vars>\
 
 <%def name="layoutExpression(e, scope, indent='', more='    ')">\
 <%
-    debug(f"layoutExpression({e} ({type(e)}), {scope})")
+    debug("layoutExpression(%s (%s), %s)", e, type(e), scope)
     if e is None or scope is None:
         raise Exception("layoutExpression with None argument!")
 %>\
@@ -362,6 +282,8 @@ ${indent}</${kind}Vars>\
 ${layoutIfThen(e, scope, indent=indent)}\
     %elif isinstance(e, BinaryOperation):
 ${layoutBinaryOperation(e, scope, indent=indent)}\
+    %elif isinstance(e, NaryOperation):
+${layoutNaryOperation(e, scope, indent=indent)}\
     %elif isinstance(e, UnaryOperation):
 ${layoutUnaryOperation(e, scope, indent=indent)}\
     %elif isinstance(e, Variable):
@@ -401,7 +323,7 @@ ${indent}END_IF\
 </%def>
 
 <%def name="render_value(node, scope, indent='')">\
-<% debug(f"render_value({node}, {scope})") %>\
+<% debug("render_value(%s, %s)", node, scope) %>\
 % if isinstance(node, Bool):
 ${str(node.value).upper()}\
 % elif isinstance(node, String):
@@ -413,7 +335,7 @@ ${node.value}\
 
 
 <%def name="layoutVariable(v,scope,indent='',more='    ')">\
-<% debug(f"layoutVariable({v}, {scope})") %>\
+<% debug("layoutVariable(%s, %s)", v, scope) %>\
 ${render_path(v, scope)}\
 </%def>
 
@@ -442,12 +364,30 @@ ${layoutExpression(node.right, scope)}\
     %endif
 </%def>
 
+<%def name="layoutNaryOperation(node, scope, indent='', more='    ')">\
+<%
+    debug("layoutNaryOperation")
+    if node.operator.plc_symbol is None:
+        raise Exception("Unknown symbol in layoutNaryOperation(%s) for operator %s" %(node, node.operator))
+%>\
+    %for operand in node.operands:
+        %if not loop.first:
+ ${escape(node.operator.plc_symbol)} \
+        %endif
+        %if isinstance(operand, Variable) or isinstance(operand, Primitive):
+${layoutExpression(operand, scope)}\
+        %else:
+(${layoutExpression(operand, scope)})\
+        %endif
+    %endfor
+</%def>
+
 
 
 <%def name="render_path(dest, scope)">\
 <% 
     prefix, path = getPrefixAndPath(dest, scope) 
-    debug(f"render_path -- prefix: {prefix}, path: {str(path)}")
+    debug("render_path -- prefix: %s, path: %s", prefix, path)
 %>\
     %if prefix is not None:
 ${prefix}\
@@ -465,13 +405,17 @@ ${item.name}\
 
 
 <%def name="render_assignment(node, scope)">\
-<% debug(f"render_assignment(node={node}, scope={[item.name for item in scope]})") %>\
+<%
+    if debugging():
+        debug("render_assignment(node=%s, scope=%s)", node, [item.name for item in scope])
+%>\
 ${node.left.name} := ${layoutExpression(node.right, scope=scope)}\
 </%def>
 
 <%def name="layoutCall(node, scope, indent='', more='    ')">\
 <%
-    debug(f"layoutCall(node={node}, scope={[item.name for item in scope]})")
+    if debugging():
+        debug("layoutCall(node=%s, scope=%s)", node, [item.name for item in scope])
 %>\
 % if isinstance(node.calls, UnaryOperation):
 ${layoutUnaryOperation(node.calls, scope, indent=indent)}\
@@ -501,7 +445,7 @@ ${indent+more}${render_assignment(assignment, scope)}\
 
 <%def name="layoutUnaryOperation(node, scope, indent='', more='    ')">\
 <%
-    debug(f"layoutUnaryOperation({node})")
+    debug("layoutUnaryOperation(%s)", node)
     if node.operator.plc_symbol is None:
         raise Exception("Unknown symbol in layoutUnaryOperation(%s) for operator %s" %(node.name), operator.name)
 %>\
@@ -547,13 +491,13 @@ ${indent}</variable>\
 
 
 <%def name="xml_type(node)">\
-<% debug(f"xml_type({node})") %>\
+<% debug("xml_type(%s)", node) %>\
 <type>${xml_type_contents(node)}</type>\
 </%def>
 
 
 <%def name="xml_type_element(node)">\
-<% debug(f"xml_type_element({node})") %>\
+<% debug("xml_type_element(%s)", node) %>\
   %if node.plc_symbol is not None:
 ##for some reason, STRING must be rendered lowercase, otherwise you cannot import the file in TwinCAT !!!
     % if node.plc_symbol == 'STRING':
@@ -567,7 +511,7 @@ ${indent}</variable>\
 </%def>
 
 <%def name="xml_type_contents(node)">\
-<% debug(f"xml_type_contents {node}") %>\
+<% debug("xml_type_contents %s", node) %>\
     %if node.type is not None:
 ${xml_type_element(node.type)}\
     %elif node.points_to_type is not None:
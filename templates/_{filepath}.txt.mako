@@ -1,13 +1,5 @@
 <%namespace name="iec61131" file="_iec61131.mako"/>\
-<%
-    import json
-    from util.factories import timeNow, Library, LIBRARY
-    #if len(M) != 1: raise Exception("Only 1 library definition per file!")
-    for item_k, item_v in M.items():
-        if isinstance(item_k, LIBRARY):
-          lib = Library(item_k.name, item_v)
-          break
-%>\
+## the library is built once by onto.py, and shared by all templates
 ${render_object(lib)}
 
 
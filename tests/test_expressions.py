@@ -0,0 +1,62 @@
+"""
+Check how the operations are laid out as structured text, by the Mako templates and by the
+native emitter (see util/plcopen.py).
+
+Run it from the root of the repository:
+
+    $ python3 -m pytest tests
+"""
+
+import io, sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import onto
+from util import plcopen
+
+
+@pytest.fixture(autouse=True)
+def in_root(monkeypatch):
+    # the templates are looked up relative to the root of the repository
+    monkeypatch.chdir(ROOT)
+
+
+def parse(source: str):
+    return yaml.load(source, Loader=onto.get_loader())
+
+
+def layout_mako(e) -> str:
+    template = onto.TEMPLATES.get(Path('./templates/_iec61131.mako'))
+    return template.get_def("layoutExpression").render(e, [])
+
+
+def layout_native(e) -> str:
+    buffer = io.StringIO()
+    plcopen.Emitter(buffer).expression(e, [], '')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("layout", [layout_mako, layout_native])
+@pytest.mark.parametrize("source, expected", [
+    # the non-associative operations are nested to the right, and keep their parentheses
+    ("!SUB [!INT16 1, !INT16 2]", "1 - 2"),
+    ("!SUB [!INT16 1, !INT16 2, !INT16 3]", "1 - (2 - 3)"),
+    ("!SUB [!INT16 1, !INT16 2, !INT16 3, !INT16 4]", "1 - (2 - (3 - 4))"),
+    ("!SUB [!SUB [!INT16 1, !INT16 2], !INT16 3]", "(1 - 2) - 3"),
+    ("!DIV [!INT16 1, !INT16 2, !INT16 3]", "1 / (2 / 3)"),
+    ("!DIV [!DIV [!INT16 1, !INT16 2], !INT16 3]", "(1 / 2) / 3"),
+    ("!SUB [!INT16 1, !SUM [!INT16 2, !INT16 3]]", "1 - (2 + 3)"),
+    # the associative ones are flattened, without parentheses
+    ("!SUM [!INT16 1, !INT16 2, !INT16 3]", "1 + 2 + 3"),
+    ("!SUM [!INT16 1, !SUM [!INT16 2, !INT16 3], !INT16 4]", "1 + 2 + 3 + 4"),
+    ("!MUL [!SUM [!INT16 1, !INT16 2], !INT16 3]", "(1 + 2) * 3"),
+    ("!AND [!BOOL true, !AND [!BOOL false, !BOOL true]]", "TRUE AND FALSE AND TRUE"),
+    ("!OR [!BOOL true, !AND [!BOOL false, !BOOL true]]", "TRUE OR (FALSE AND TRUE)"),
+])
+def test_layout(layout, source, expected):
+    assert layout(parse(source)) == expected
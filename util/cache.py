@@ -0,0 +1,82 @@
+"""
+Helper module to cache the parsed yaml models on disk.
+
+A cached model is keyed by a hash of the yaml content and of the onto version
+(including the source code of onto, since the cached objects are
+instances of its classes). Whenever anything doesn't match, the model is simply
+parsed again.
+"""
+
+import hashlib, os, pickle, tempfile
+from pathlib import Path
+from util import logger
+
+
+# increase this number whenever the layout of the cache files changes
+SCHEMA = 1
+
+
+def source_digest(sources: list[Path] = []) -> str:
+    """Return a hash of the source code of the util package (and of the given extra sources)."""
+    h = hashlib.sha256()
+    for fp in sorted(Path(__file__).parent.glob('*.py')) + list(sources):
+        h.update(fp.name.encode())
+        h.update(fp.read_bytes())
+    return h.hexdigest()
+
+
+class ModelCache:
+    """
+    A directory holding the pickled models, one file per yaml content hash.
+    """
+
+    def __init__(self, directory: str | Path, version: str, sources: list[Path] = []) -> None:
+        self.directory = Path(directory)
+        self.version = f"{version}+{source_digest(sources)}"
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, content: bytes) -> str:
+        """Return the cache key of the given yaml content."""
+        h = hashlib.sha256()
+        h.update(f"{SCHEMA}:{self.version}:".encode())
+        h.update(content)
+        return h.hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.pickle"
+
+    def load(self, input_fp: Path, content: bytes) -> dict | None:
+        """Return the cached model of the given content, or None if it's not (validly) cached."""
+        key = self.key(content)
+        fp = self.path(key)
+        if not fp.exists():
+            logger.debug("Cache miss for %s", input_fp)
+            self.misses += 1
+            return None
+        try:
+            with open(fp, 'rb') as file:
+                header, model = pickle.load(file)
+            if header != { "schema": SCHEMA, "version": self.version, "key": key }:
+                raise ValueError(f"header mismatch ({header})")
+        except Exception as e:
+            logger.info(f"Ignoring invalid cache file {fp} for {input_fp}: {e}")
+            self.misses += 1
+            return None
+        logger.debug("Cache hit for %s", input_fp)
+        self.hits += 1
+        return model
+
+    def store(self, input_fp: Path, content: bytes, model: dict) -> None:
+        """Store the model of the given content in the cache."""
+        key = self.key(content)
+        header = { "schema": SCHEMA, "version": self.version, "key": key }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump((header, model), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+        except Exception as e:
+            logger.info(f"Could not cache the model of {input_fp}: {e}")
+            Path(tmp).unlink(missing_ok=True)
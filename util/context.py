@@ -0,0 +1,95 @@
+"""
+Helper module holding the state of a build.
+
+All state of a build lives in a BuildContext: the symbol table, the files imported (and the
+number of times they were parsed) so far, the global namespace with the primitive types and
+the global LogBuffer and LOGGER objects, and the timestamp to write in the outputs. Nothing
+of it is stored at the module level, so builds don't see each other's objects, and a build's
+memory is released once its context (and its libraries) are no longer referenced.
+
+Only the measurements are process-wide: the compile and render times of the templates (see
+onto.TEMPLATES) and the profile (see util/profiler.py) add up the time of all builds that run
+concurrently in the same process.
+
+The objects find their context via current(), which returns the context that is active in
+the current thread (or asyncio task), or else a default context for this process.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from util.imports import ParseCounter
+
+
+# the context that is active in the current thread or task
+_ACTIVE = ContextVar("build_context", default=None)
+
+# the context that is used if none is active
+_DEFAULT = None
+
+
+class BuildContext:
+    """
+    The state of a single build (e.g. a run of onto, which builds all models in import order).
+    """
+
+    def __init__(self, timestamp: str = None) -> None:
+        # imported here, since these modules refer to the current context themselves
+        from util import factories
+        from util.objects import SymbolTable
+        from util.paths import PathResolver
+
+        self.timestamp = factories.now() if timestamp is None else timestamp
+        self.symbols = SymbolTable()
+        # the files that have been loaded already
+        self.imported = []
+        # the number of times each file was parsed
+        self.parsed = ParseCounter()
+        # the number of objects created per class (reset by whoever wants to count them)
+        self.created = Counter()
+        # the expansions of the types, see factories.expansion_of()
+        self.expansions = {}
+        # the paths of the references, resolved while rendering
+        self.paths = PathResolver()
+        # whether the library items are fingerprinted, and the fingerprint of the item being
+        # created (the origin of its types), see util/fragments.py
+        self.fingerprint_items = False
+        self.origin = None
+        self.global_ns = None
+        self.primitives = None
+        with self.active():
+            factories.create_globals(self)
+
+    def start_run(self):
+        """
+        Drop the state of the previous run, if this context is reused by another one (e.g. in watch mode).
+
+        The libraries of the previous run are kept in the symbol table (they are replaced when
+        they are built again), but the lookups, expansions and paths that may still refer to the
+        replaced ones are forgotten. The files are imported (and counted) again by the new run.
+        """
+        self.imported.clear()
+        self.parsed.clear()
+        self.symbols.cache.clear()
+        self.expansions.clear()
+        self.paths.clear()
+
+    @contextmanager
+    def active(self):
+        """Make this the current context, within a with block."""
+        token = _ACTIVE.set(self)
+        try:
+            yield self
+        finally:
+            _ACTIVE.reset(token)
+
+
+def current() -> BuildContext:
+    """Return the active context (or the default context of this process, if none is active)."""
+    context = _ACTIVE.get()
+    if context is None:
+        global _DEFAULT
+        if _DEFAULT is None:
+            _DEFAULT = BuildContext()
+        context = _DEFAULT
+    return context
@@ -13,6 +13,8 @@ class Expression(Object):
     """
     Base class for UnaryExpression and BinaryExpression.
     """
+    __slots__ = ("operator",)
+
     def __init__(self, operator: Operator) -> None:
         super().__init__(None, None)
         self.operator = operator
@@ -22,6 +24,7 @@ class UnaryOperation(Expression):
     """
     Base class for unary operations like NOT, ADR, ...
     """
+    __slots__ = ("operand",)
 
     def __init__(self, operand: Object, operator: Operator) -> None:
         super().__init__(operator)
@@ -35,16 +38,18 @@ class UnaryOperation(Expression):
 
 class BinaryOperation(Expression):
     """
-    Base class for binary operations like AND, SUM, ...
+    Base class for binary operations like SUB, EQ, ...
+
+    More than 2 operands are nested to the right, i.e. !SUB [a, b, c] means a - (b - c).
     """
+    __slots__ = ("left", "right")
 
     def __init__(self, operands: list[Object], operator: Operator) -> None:
         super().__init__(operator)
         self.left = operands[0]
-        if len(operands) > 2:
-            self.right = BinaryOperation(operands[1:], operator)
-        else:
-            self.right = operands[1]
+        self.right = operands[-1]
+        for operand in reversed(operands[1:-1]):
+            self.right = BinaryOperation([operand, self.right], operator)
         self.register_child("left", self.left)
         self.register_child("right", self.right)
     
@@ -54,6 +59,31 @@ class BinaryOperation(Expression):
         self.right = self.children["right"]
 
 
+class NaryOperation(Expression):
+    """
+    Base class for operations with an associative operator like AND, SUM, ..., on 2 or more operands.
+
+    Operands that are operations with the same operator are merged, so !AND [a, !AND [b, c]]
+    is a single operation with operands a, b and c.
+    """
+    __slots__ = ("operands",)
+
+    def __init__(self, operands: list[Object], operator: Operator) -> None:
+        super().__init__(operator)
+        self.operands = []
+        for operand in operands:
+            if isinstance(operand, NaryOperation) and operand.operator is operator:
+                self.operands += operand.operands
+            else:
+                self.operands.append(operand)
+        for i, operand in enumerate(self.operands):
+            self.register_child(f"operand{i}", operand)
+
+    def resolve_children(self, context):
+        super().resolve_children(context)
+        self.operands = list(self.children.values())
+
+
 class IfThen(Object):
     """
     If-then-else construct (holding if/then/else expressions).
@@ -108,57 +138,79 @@ class OPERATORS:
 
 class ASSIGN(BinaryOperation):
     """Operation :="""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.ASSIGN)
 
 
-class AND(BinaryOperation):
+class AND(NaryOperation):
     """Operation AND"""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.AND)
 
-class OR(BinaryOperation):
+class OR(NaryOperation):
     """Operation OR"""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.OR)
 
 class EQ(BinaryOperation):
     """Operation ="""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.EQ)
 
 class LT(BinaryOperation):
     """Operation <"""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.LT)
 
 class GT(BinaryOperation):
     """Operation >"""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.GT)
 
 class GE(BinaryOperation):
     """Operation >="""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.GE)
 
 class LE(BinaryOperation):
     """Operation <="""
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.LE)
 
 class NOT(UnaryOperation):
     """Operation NOT"""
+    __slots__ = ()
+
     def __init__(self, operand) -> None:
         super().__init__(operand, OPERATORS.NOT)
 
 class ADR(UnaryOperation):
     """Operation ADR"""
+    __slots__ = ()
+
     def __init__(self, operand) -> None:
         super().__init__(operand, OPERATORS.ADR)
 
 class PLC_DEREF(UnaryOperation):
     """Operation ^"""
+    __slots__ = ()
+
     def __init__(self, operand) -> None:
         super().__init__(operand, OPERATORS.PLC_DEREF)
 
@@ -232,12 +284,16 @@ def LE_constructor(loader, node):
 
 
 class Primitive(Object):
+    __slots__ = ("value",)
+
     def __init__(self, value) -> None:
         super().__init__(None, None)
         self.value = value
 
 
 class Bool(Primitive):
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         if str(value).upper() == "TRUE":
             v = True
@@ -248,6 +304,8 @@ class Bool(Primitive):
         super().__init__(v)
 
 class UInt8(Primitive):
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         try:
             v = int(value)
@@ -256,6 +314,8 @@ class UInt8(Primitive):
         super().__init__(v)
 
 class Double(Primitive):
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         try:
             v = float(value)
@@ -264,6 +324,8 @@ class Double(Primitive):
         super().__init__(v)
 
 class UInt16(Primitive):
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         try:
             v = int(value)
@@ -272,6 +334,8 @@ class UInt16(Primitive):
         super().__init__(v)
 
 class Int16(Primitive):
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         try:
             v = int(value)
@@ -280,6 +344,8 @@ class Int16(Primitive):
         super().__init__(v)
 
 class String(Primitive):
+    __slots__ = ()
+
     def __init__(self, value: str) -> None:
         super().__init__(str(value))
 
@@ -318,28 +384,36 @@ def String_constructor(loader, node):
 #####################################################################################
 
 
-class MTCS_SUMMARIZE_BUSY(BinaryOperation):
+class MTCS_SUMMARIZE_BUSY(NaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         new_operands = []
         for operand in operands:
             new_operands.append(operand + ".statuses.busyStatus.busy")
         super().__init__(new_operands, OPERATORS.OR)
 
-class MTCS_SUMMARIZE_GOOD(BinaryOperation):
+class MTCS_SUMMARIZE_GOOD(NaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         new_operands = []
         for operand in operands:
             new_operands.append(operand + ".statuses.healthStatus.isGood")
         super().__init__(new_operands, OPERATORS.AND)
 
-class MTCS_SUMMARIZE_WARN(BinaryOperation):
+class MTCS_SUMMARIZE_WARN(NaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         new_operands = []
         for operand in operands:
             new_operands.append(operand + ".statuses.healthStatus.hasWarning")
         super().__init__(new_operands, OPERATORS.OR)
 
-class MTCS_SUMMARIZE_GOOD_OR_DISABLED(BinaryOperation):
+class MTCS_SUMMARIZE_GOOD_OR_DISABLED(NaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         new_operands = []
         for operand in operands:
@@ -1,5 +1,18 @@
-from datetime import datetime
-timeNow = datetime.now().isoformat()
+import os
+from datetime import datetime, timezone
+from collections.abc import Mapping
+
+def now() -> str:
+    """
+    Return the timestamp to write in the outputs.
+
+    If SOURCE_DATE_EPOCH is set (see https://reproducible-builds.org/specs/source-date-epoch/),
+    that time is used instead of the current time, so that unchanged models produce identical outputs.
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if epoch:
+        return datetime.fromtimestamp(int(epoch), tz=timezone.utc).replace(tzinfo=None).isoformat()
+    return datetime.now().isoformat()
 
 try:
     from yaml import CLoader as Loader
@@ -7,14 +20,16 @@ except ImportError:
     from yaml import Loader
 
 from util.expressions import *
-from util.objects import add_global, get_global, Object, resolve
-from util import logger
+from util.objects import add_global, get_global, Object, resolve, EMPTY
+from util.context import current
+from util import logger, fragments
 
 
 class Primitive(Object):
     """
     A class to represent a primitive type (t_bool, t_double, ...).
     """
+    __slots__ = ("plc_symbol",)
 
     def __init__(self, name, plc_symbol=None) -> None:
         super().__init__(name, None)
@@ -23,44 +38,27 @@ class Primitive(Object):
 
 class PRIMITIVE_TYPES:
     """
-    Just a class to hold the various primitive types.
-    """
-    t_bool       = Primitive("t_bool"       , plc_symbol="BOOL")
-    t_bytestring = Primitive("t_bytestring" , plc_symbol=None)
-    t_double     = Primitive("t_double"     , plc_symbol="LREAL")
-    t_float      = Primitive("t_float"      , plc_symbol="REAL")
-    t_int16      = Primitive("t_int16"      , plc_symbol="INT")
-    t_int32      = Primitive("t_int32"      , plc_symbol="DINT")
-    t_int64      = Primitive("t_int64"      , plc_symbol="LINT")
-    t_int8       = Primitive("t_int8"       , plc_symbol="SINT")
-    t_uint16     = Primitive("t_uint16"     , plc_symbol="UINT")
-    t_uint32     = Primitive("t_uint32"     , plc_symbol="UDINT")
-    t_uint64     = Primitive("t_uint64"     , plc_symbol="ULINT")
-    t_uint8      = Primitive("t_uint8"      , plc_symbol="USINT")
-    t_string     = Primitive("t_string"     , plc_symbol="STRING")
-    t_byte       = Primitive("t_byte"       , plc_symbol="BYTE")
-    t_word       = Primitive("t_word"       , plc_symbol="WORD")
-    t_dword      = Primitive("t_dword"      , plc_symbol="DWORD")
-
-
-# add the above primitive types to the global namespace
-add_global("t_bool",       PRIMITIVE_TYPES.t_bool)
-add_global("t_bytestring", PRIMITIVE_TYPES.t_bytestring)
-add_global("t_double",     PRIMITIVE_TYPES.t_double)
-add_global("t_float",      PRIMITIVE_TYPES.t_float)
-add_global("t_int16",      PRIMITIVE_TYPES.t_int16)
-add_global("t_int32",      PRIMITIVE_TYPES.t_int32)
-add_global("t_int64",      PRIMITIVE_TYPES.t_int64)
-add_global("t_int8",       PRIMITIVE_TYPES.t_int8)
-add_global("t_uint16",     PRIMITIVE_TYPES.t_uint16)
-add_global("t_uint32",     PRIMITIVE_TYPES.t_uint32)
-add_global("t_uint64",     PRIMITIVE_TYPES.t_uint64)
-add_global("t_uint8",      PRIMITIVE_TYPES.t_uint8)
-add_global("t_string",     PRIMITIVE_TYPES.t_string)
-add_global("t_byte",       PRIMITIVE_TYPES.t_byte)
-add_global("t_word",       PRIMITIVE_TYPES.t_word)
-add_global("t_dword",       PRIMITIVE_TYPES.t_dword)
-
+    Just a class to hold the various primitive types (of a build context).
+    """
+
+    def __init__(self) -> None:
+        # (an object without a parent is added to the globals automatically)
+        self.t_bool       = Primitive("t_bool"       , plc_symbol="BOOL")
+        self.t_bytestring = Primitive("t_bytestring" , plc_symbol=None)
+        self.t_double     = Primitive("t_double"     , plc_symbol="LREAL")
+        self.t_float      = Primitive("t_float"      , plc_symbol="REAL")
+        self.t_int16      = Primitive("t_int16"      , plc_symbol="INT")
+        self.t_int32      = Primitive("t_int32"      , plc_symbol="DINT")
+        self.t_int64      = Primitive("t_int64"      , plc_symbol="LINT")
+        self.t_int8       = Primitive("t_int8"       , plc_symbol="SINT")
+        self.t_uint16     = Primitive("t_uint16"     , plc_symbol="UINT")
+        self.t_uint32     = Primitive("t_uint32"     , plc_symbol="UDINT")
+        self.t_uint64     = Primitive("t_uint64"     , plc_symbol="ULINT")
+        self.t_uint8      = Primitive("t_uint8"      , plc_symbol="USINT")
+        self.t_string     = Primitive("t_string"     , plc_symbol="STRING")
+        self.t_byte       = Primitive("t_byte"       , plc_symbol="BYTE")
+        self.t_word       = Primitive("t_word"       , plc_symbol="WORD")
+        self.t_dword      = Primitive("t_dword"      , plc_symbol="DWORD")
 
 
 class PlcOpenAttribute:
@@ -88,9 +86,14 @@ class QUALIFIERS:
 class Namespace(Object):
     """
     A class representing a PLCopen namespace
+
+    Besides its children, a namespace keeps a registry of the children that matter for the
+    PLCopen project (namespaces, enums, function blocks and structs), in the same order. So the
+    types of a library can be collected without walking over all other children.
     """
 
     def __init__(self, name: str, parent: Object):
+        self.registry = {}
         super().__init__(name, parent)
 
     def __setitem__(self, name: str, item: Object):
@@ -101,41 +104,52 @@ class Namespace(Object):
     
     def items(self):
         return self.children.items()
+
+    def register_child(self, name: str, child: Object):
+        super().register_child(name, child)
+        # a name that is registered already keeps its position (like in the children), even if
+        # the new child is of another kind
+        if name in self.registry or isinstance(child, (Namespace, Enum, FunctionBlock, Struct)):
+            self.registry[name] = child
+
+    def collect(self, kind: type, recursive: bool, result: list, seen: set = None):
+        """
+        Append the children of the given kind (depth first, if recursive) to the result, unless
+        they're in the result already.
+        """
+        if seen is None:
+            seen = set(map(id, result))
+        for child in self.registry.values():
+            if isinstance(child, Namespace) and recursive:
+                child.collect(kind, recursive, result, seen)
+            elif isinstance(child, kind) and id(child) not in seen:
+                seen.add(id(child))
+                result.append(child)
     
     def get_namespaces(self, recursive: bool, namespaces: list):
-        for child in self.children.values():
+        for child in self.registry.values():
             if isinstance(child, Namespace):
                 if recursive:
                     child.get_namespaces(recursive, namespaces)
                 namespaces.append(child)
     
     def get_enums(self, recursive: bool, enums: list):
-        for child in self.children.values():
-            if isinstance(child, Namespace) and recursive:
-                child.get_enums(recursive, enums)
-            elif isinstance(child, Enum):
-                if child not in enums:
-                    enums.append(child)
+        self.collect(Enum, recursive, enums)
     
     def get_fbs(self, recursive: bool, fbs: list):
-        for child in self.children.values():
-            if isinstance(child, Namespace) and recursive:
-                child.get_fbs(recursive, fbs)
-            elif isinstance(child, FunctionBlock):
-                if child not in fbs:
-                    fbs.append(child)
+        self.collect(FunctionBlock, recursive, fbs)
     
     def get_structs(self, recursive: bool, structs: list):
-        for child in self.children.values():
-            if isinstance(child, Namespace) and recursive:
-                child.get_structs(recursive, structs)
-            elif isinstance(child, Struct):
-                if child not in structs:
-                    structs.append(child)
+        self.collect(Struct, recursive, structs)
     
 
-# define the global namespace
-GLOBAL_NS = Namespace("GLOBAL_NS", None)
+class GlobalNamespace(Namespace):
+    """
+    The root namespace, holding the libraries.
+
+    It doesn't contribute to the qualified names, so a library is known by its own name.
+    """
+    is_root = True
 
 
 
@@ -154,8 +168,14 @@ class Library(Namespace):
             self.args = Namespace("Args", self)
 
 
-    def __init__(self, name, args):
-        super().__init__(name, GLOBAL_NS)  # a library has no parent!
+    def __init__(self, name, args, context=None):
+        # the library (and all objects it contains) belong to a build context
+        self.context = current() if context is None else context
+        with self.context.active():
+            self.create(name, args)
+
+    def create(self, name, args):
+        super().__init__(name, self.context.global_ns)  # a library has no parent!
 
         # define the sub-namespaces
         self.enums = Namespace("Enums", self)
@@ -168,6 +188,9 @@ class Library(Namespace):
 
         # add the items
         for arg_k, arg_v in args.items():
+            # fingerprint the item before it's created (which resolves its references in place)
+            if self.context.fingerprint_items:
+                self.context.origin = fragments.digest(arg_k, arg_v)
             if isinstance(arg_k, ENUMERATION):
                 self.enums[arg_k.name] = Enum(arg_k.name, self, arg_v) 
             elif isinstance(arg_k, STATEMACHINE):
@@ -189,6 +212,7 @@ class Library(Namespace):
             elif isinstance(arg_k, PROCESS):
                 proc = Process(arg_k.name, self, arg_v) 
                 self.processes[arg_k.name] = proc
+        self.context.origin = None
 
 
 def check_args(name, args, allowed_args):
@@ -207,6 +231,7 @@ class Enum(Object):
         super().__init__(name, parent)
         check_args("Enum", args, ["type", "items", "comment"])
         
+        self.origin = current().origin
         self.type = None
         self.items = []
         self.comment = None
@@ -358,12 +383,145 @@ def PROCESS_constructor(loader: Loader, node):
     return PROCESS(name)
 
 
+# returned by getattr() for attributes that don't exist
+_NOTHING = object()
+
+# the slot holding the children of an object (which is wrapped by the Variable.children property)
+_CHILDREN = Object.children
+
+
+class Expansion:
+    """
+    A snapshot of the children of a type, from which the variables of that type are expanded.
+
+    For each child, the snapshot holds its name, the child itself, and its type and raw_args (or
+    _NOTHING). The members are the copies that a variable of the type gets: for each of them,
+    the class and the arguments to create it with. These arguments are shared by all copies of
+    the same member, so a copy only has its own name and parent (and the children it gets later).
+    """
+    __slots__ = ("type", "snapshot", "members")
+
+    def __init__(self, type_: Object) -> None:
+        self.type = type_
+        self.snapshot = tuple((child_name, child, getattr(child, 'type', _NOTHING), getattr(child, 'raw_args', _NOTHING))
+                              for child_name, child in type_.children.items())
+        self.members = {}
+        for child_name, child, child_type, raw_args in self.snapshot:
+            if child_type is _NOTHING:
+                continue
+            if child_type is not None:
+                self.members[child_name] = (Variable, { "type": child_type })
+            elif isinstance(child, Method):
+                method_args = {}
+                method_args["inputArgs"] = {}
+                method_args["inOutArgs"] = {}
+                for var_name, var in child.var_in.items():
+                    method_args["inputArgs"][var_name] = {}
+                for var_name, var in child.var_inout.items():
+                    method_args["inOutArgs"][var_name] = {}
+                if child.return_type is not None:
+                    method_args["returnType"] = child.return_type
+                self.members[child_name] = (Method, method_args)
+            elif raw_args is not _NOTHING:
+                child_args = {}
+                if 'attributes' in raw_args:
+                    child_args['attributes'] = raw_args['attributes']
+                if 'arguments' in raw_args:
+                    child_args['arguments'] = raw_args['arguments']
+                self.members[child_name] = (Variable, child_args)
+
+    def is_valid_for(self, type_: Object) -> bool:
+        """Check if the snapshot still matches the (current children of the) given type."""
+        if self.type is not type_ or len(self.snapshot) != len(type_.children):
+            return False
+        for (child_name, child), (name, snapshot_child, child_type, raw_args) in zip(type_.children.items(), self.snapshot):
+            if child_name != name or child is not snapshot_child \
+                    or getattr(child, 'type', _NOTHING) is not child_type \
+                    or getattr(child, 'raw_args', _NOTHING) is not raw_args:
+                return False
+        return True
+
+
+def expansion_of(type_: Object) -> Expansion:
+    """
+    Return the expansion of a type, which is shared by all variables of the type, as long as
+    the type (and the types of its children) didn't change.
+    """
+    expansions = current().expansions
+    cached = expansions.get(id(type_))
+    if cached is not None and cached.is_valid_for(type_):
+        return cached
+    expansion = Expansion(type_)
+    expansions[id(type_)] = expansion
+    return expansion
+
+
+class ExpandedChildren(Mapping):
+    """
+    The children of an expanded variable.
+
+    The copies of the members of the type are created one by one, when they're accessed for the
+    first time. So a variable of a big type of which only one member is referred to, only gets
+    that one copy. Iterating over the children creates all copies, and yields them in the same
+    order as if they were created immediately (i.e. the members first, then the other children).
+    """
+    __slots__ = ("owner", "expansion", "created")
+
+    def __init__(self, owner: Object, expansion: Expansion) -> None:
+        self.owner = owner
+        self.expansion = expansion
+        self.created = {}
+
+    def get(self, name, default=None):
+        child = self.created.get(name, _NOTHING)
+        if child is not _NOTHING:
+            return child
+        member = self.expansion.members.get(name)
+        if member is None:
+            return default
+        cls, args = member
+        # the copy registers itself as a child of the owner, i.e. in self.created
+        return cls(name, self.owner, args)
+
+    def __getitem__(self, name):
+        child = self.get(name, _NOTHING)
+        if child is _NOTHING:
+            raise KeyError(name)
+        return child
+
+    def __setitem__(self, name, child):
+        self.created[name] = child
+
+    def __contains__(self, name):
+        return name in self.created or name in self.expansion.members
+
+    def __iter__(self):
+        yield from self.expansion.members
+        for name in list(self.created):
+            if name not in self.expansion.members:
+                yield name
+
+    def __len__(self):
+        return len(self.expansion.members) + sum(1 for name in self.created if name not in self.expansion.members)
+
+    def __repr__(self):
+        return f"ExpandedChildren({list(self)})"
+
+
 class Variable(Object):
     """
     Class respresenting a PLCopen Variable.
+
+    A variable of a type gets (expanded) copies of the members of that type. These copies are
+    only created when they're accessed for the first time, since most of them are never referred
+    to. They're based on a snapshot of the type when the variable was created, so the result is
+    the same as if they were created immediately.
     """
+    __slots__ = ("raw_args", "type", "expand", "initial", "comment", "points_to_type", "attributes",
+                 "qualifiers", "arguments", "address", "copyFrom", "methods", "pending_expansion")
 
     def __init__(self, name, parent, args={}):
+        self.pending_expansion = None
         super().__init__(name, parent)
         check_args("Variable", args, 
                    ["type", "expand", "initial", "comment",
@@ -381,11 +539,11 @@ class Variable(Object):
         self.comment = ""
         self.points_to_type = None
         self.attributes = None
-        self.qualifiers = []
+        self.qualifiers = ()
         self.arguments = None
         self.address = None
         self.copyFrom = None
-        self.methods = {}
+        self.methods = EMPTY
 
         if 'expand' in args:
             self.expand = args['expand']
@@ -394,29 +552,9 @@ class Variable(Object):
             self.type = resolve(args['type'], self)
 
             if self.expand:
-                for child_name, child in self.type.children.items():
-                    if hasattr(child, 'type'):
-                        if child.type is not None:
-                            self.register_child(child_name, Variable(child_name, self, { "type": child.type  }))
-                        elif isinstance(child, Method):
-                            method_args = {}
-                            method_args["inputArgs"] = {}
-                            method_args["inOutArgs"] = {}
-                            for var_name, var in child.var_in.items():
-                                method_args["inputArgs"][var_name] = {}
-                            for var_name, var in child.var_inout.items():
-                                method_args["inOutArgs"][var_name] = {}
-                            if child.return_type is not None:
-                                method_args["returnType"] = child.return_type
-                            self.register_child(child_name, Method(child_name, self, method_args))
-                        elif hasattr(child, 'raw_args'):
-                            child_args = {}
-                            if 'attributes' in child.raw_args:
-                                child_args['attributes'] = child.raw_args['attributes']
-                            if 'arguments' in child.raw_args:
-                                child_args['arguments'] = child.raw_args['arguments']
-
-                            self.register_child(child_name, Variable(child_name, self, child_args))
+                expansion = expansion_of(self.type)
+                if len(expansion.members) > 0:
+                    self.pending_expansion = expansion
 
         if 'initial' in args:
             self.initial = args['initial']
@@ -431,7 +569,7 @@ class Variable(Object):
         if 'qualifiers' in args:
             for qualifier in args['qualifiers']:
                 # TODO: resolve?
-                self.qualifiers.append(qualifier)
+                self.add_qualifier(qualifier)
         if 'arguments' in args:
             self.arguments = {}
             for argument_k, argument_v in args['arguments'].items():
@@ -440,12 +578,43 @@ class Variable(Object):
         if 'address' in args:
             self.address = args['address']
 
+    @property
+    def children(self):
+        if self.pending_expansion is not None:
+            _CHILDREN.__set__(self, ExpandedChildren(self, self.pending_expansion))
+            self.pending_expansion = None
+        return _CHILDREN.__get__(self)
+
+    @children.setter
+    def children(self, children):
+        _CHILDREN.__set__(self, children)
+
+    def resolve_children(self, context):
+        # resolving the children of a variable only resolves (the children of) its copies, which are
+        # all objects already, so there's no need to create the copies for that
+        if self.pending_expansion is not None or isinstance(_CHILDREN.__get__(self), ExpandedChildren):
+            self.resolved = True
+            return
+        super().resolve_children(context)
+
+    def add_qualifier(self, qualifier):
+        """Add a qualifier (the qualifiers are a tuple, so that variables without qualifiers can share one)."""
+        self.qualifiers = (*self.qualifiers, qualifier)
+
+    def add_method(self, name, method):
+        """Add a method (the methods dict is only created for the few variables that have methods)."""
+        if self.methods is EMPTY:
+            self.methods = {}
+        self.methods[name] = method
+
 
 
 class EnumItem(Variable):
     """
     Class respresenting a PLCopen enum item.
     """
+    __slots__ = ("number",)
+
     def __init__(self, name, parent, number) -> None:
         super().__init__(name, parent)
         self.number = number
@@ -455,7 +624,7 @@ class GlobalVariable(Variable):
     """
     Class respresenting a PLCopen global Variable.
     """
-    pass
+    __slots__ = ()
 
 
 class Struct(Object):
@@ -468,6 +637,7 @@ class Struct(Object):
 
         logger.info(f"Creating Struct {name}")
 
+        self.origin = current().origin
         self.items = None
         self.plc_symbol = None
         for arg in args:
@@ -513,6 +683,8 @@ class Method(Object):
     """
     Class respresenting a PLCopen method.
     """
+    __slots__ = ("comment", "var_in", "var_inout", "var_local", "var_out", "return_type",
+                 "implementation", "extends", "type", "points_to_type")
 
     def __init__(self, name, parent, args={}) -> None:
         super().__init__(name, parent)
@@ -521,10 +693,10 @@ class Method(Object):
              "comment", "implementation"])
         
         self.comment = ""
-        self.var_in = {}
-        self.var_inout = {}
-        self.var_local = {}
-        self.var_out = {} # only here for backwards compatibility
+        self.var_in = EMPTY
+        self.var_inout = EMPTY
+        self.var_local = EMPTY
+        self.var_out = EMPTY # only here for backwards compatibility
         self.return_type = None
         self.implementation = None
         self.extends = None
@@ -569,6 +741,7 @@ class FunctionBlock(Object):
         check_args("FunctionBlock", args, 
                    ["typeOf", "extends", "comment", "in", "out", "inout", "render"])
         
+        self.origin = current().origin
         self.var_in = {}
         self.var_out = {}
         self.var_inout = {}
@@ -662,7 +835,7 @@ class Status(FunctionBlock):
                         "type": "t_bool",
                         "comment": var_args["comment"] 
                     })
-                v.qualifiers = [QUALIFIERS.OPC_UA_ACTIVATE, QUALIFIERS.OPC_UA_ACCESS_R]
+                v.qualifiers = (QUALIFIERS.OPC_UA_ACTIVATE, QUALIFIERS.OPC_UA_ACCESS_R)
                 self.var_out[var_name] = v
         
         self.implementation = []
@@ -686,6 +859,7 @@ class Pointer(Variable):
     """
     Class respresenting a Pointer.
     """
+    __slots__ = ("points_to",)
 
     def __init__(self, name, parent, args={}) -> None:
         super().__init__(name, parent)
@@ -738,15 +912,15 @@ class Statemachine(FunctionBlock):
 
         if "actualStatus" not in self.children:
             v = Variable("actualStatus", self)
-            v.type = PRIMITIVE_TYPES.t_string
+            v.type = current().primitives.t_string
             v.comment = "Current status description"
-            v.qualifiers = [QUALIFIERS.OPC_UA_ACTIVATE, QUALIFIERS.OPC_UA_ACCESS_R]
+            v.qualifiers = (QUALIFIERS.OPC_UA_ACTIVATE, QUALIFIERS.OPC_UA_ACCESS_R)
             self.var_out['actualStatus'] = v
             self.vars['actualStatus'] = v
         
         if "previousStatus" not in self.children:
             v = Variable("previousStatus", self)
-            v.type = PRIMITIVE_TYPES.t_string
+            v.type = current().primitives.t_string
             v.comment = "Previous status description"
             self.var_out["previousStatus"] = v
             self.vars['previousStatus'] = v
@@ -755,9 +929,9 @@ class Statemachine(FunctionBlock):
             for var_name, var in args['variables'].items():
                 v = Variable(var_name, self, var)
                 if QUALIFIERS.OPC_UA_ACTIVATE not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_ACTIVATE)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_ACTIVATE)
                 if QUALIFIERS.OPC_UA_ACCESS_R not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_ACCESS_R)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_ACCESS_R)
                 self.var_in[var_name] = v
                 self.vars[var_name] = v
 
@@ -765,9 +939,9 @@ class Statemachine(FunctionBlock):
             for var_name, var in args['variables_read_only'].items():
                 v = Variable(var_name, self, var)
                 if QUALIFIERS.OPC_UA_ACTIVATE not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_ACTIVATE)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_ACTIVATE)
                 if QUALIFIERS.OPC_UA_ACCESS_R not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_ACCESS_R)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_ACCESS_R)
                 self.var_out[var_name] = v
                 self.vars[var_name] = v
 
@@ -775,7 +949,7 @@ class Statemachine(FunctionBlock):
             for var_name, var in args['variables_hidden'].items():
                 v = Variable(var_name, self, var)
                 if QUALIFIERS.OPC_UA_DEACTIVATE not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_DEACTIVATE)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_DEACTIVATE)
                 self.var_in[var_name] = v
                 self.vars[var_name] = v
 
@@ -783,7 +957,7 @@ class Statemachine(FunctionBlock):
             for var_name, var in args['references'].items():
                 v = Variable(var_name, self, var)
                 if QUALIFIERS.OPC_UA_DEACTIVATE not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_DEACTIVATE)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_DEACTIVATE)
                 self.var_inout[var_name] = v
                 self.vars[var_name] = v
 
@@ -822,11 +996,11 @@ class Statemachine(FunctionBlock):
                 except Exception as e:
                     print("=========")
                     import pprint
-                    pprint.pprint(self.var_out["parts"].__dict__)
+                    pprint.pprint(self.var_out["parts"].as_dict())
                     print("=========")
                     pprint.pprint(struct.__dict__)
                     print("=========")
-                    pprint.pprint(struct.items["io"].__dict__)
+                    pprint.pprint(struct.items["io"].as_dict())
                     print("=========")
                     raise
 
@@ -883,7 +1057,7 @@ class Statemachine(FunctionBlock):
         if "local" in args:
             for var_name, var in args['local'].items():
                 v = Variable(var_name, self, var)
-                v.qualifiers = [QUALIFIERS.OPC_UA_ACTIVATE]
+                v.qualifiers = (QUALIFIERS.OPC_UA_ACTIVATE,)
                 self.var_local[var_name] = v
                 self.vars[var_name] = v
 
@@ -969,11 +1143,11 @@ class Statemachine(FunctionBlock):
 
             for part_name, part in self.parts.items():
                 if not "_log" in part.children:
-                    part.methods["_log"] = \
+                    part.add_method("_log",
                         Method("_log", part, {
                            "inputArgs" : { "name": { "type": "t_string" } },
                            "inOutArgs" : { "buffer" : { "type": "LogBuffer" } },
-                           "returnType": "t_bool" })
+                           "returnType": "t_bool" }))
                     
                 part_call = Call(f"call_{part_name}", self)
                 part_call.calls = part.children["_log"]
@@ -986,11 +1160,11 @@ class Statemachine(FunctionBlock):
 
             for process_name, process in self.processes.items():
                 if not "_log" in process.children:
-                    process.methods["_log"] = \
+                    process.add_method("_log",
                         Method("_log", process, {
                            "inputArgs" : { "name": { "type": "t_string" } },
                            "inOutArgs" : { "buffer" : { "type": "LogBuffer" } },
-                           "returnType": "t_bool" })
+                           "returnType": "t_bool" }))
                     
                 process_call = Call(f"call_{process_name}", self)
                 process_call.calls = process.children["_log"]
@@ -1029,23 +1203,30 @@ class Statemachine(FunctionBlock):
                 subject.type = main_sm
         
 
-# create the global LogBuffer struct
-add_global("LogBuffer", Struct(name="LogBuffer", parent=None))
-
-# create the global LOGGER
-add_global("LOGGER", GlobalVariable(name="LOGGER", 
-                                    parent=None, 
-                                    args={ "arguments": 
-                                            {
-                                              "name": {"type": "t_string"},
-                                              "actualStatus" : {"type": "t_string"},
-                                              "previousStatus" : {"type": "t_string"},
-                                              "buffer" : {"type": "LogBuffer"},
-                                              "subBuffer" : {"type": "LogBuffer"},
-                                              "pHealthStatus" : {"type": "t_string"},
-                                              "pBusyStatus" : {"type": "t_string"}
-                                            }
-                                    }))
+def create_globals(context):
+    """Create the global objects of a (new, active) build context."""
+    context.primitives = PRIMITIVE_TYPES()
+
+    # define the global namespace
+    context.global_ns = GlobalNamespace("GLOBAL_NS", None)
+
+    # create the global LogBuffer struct
+    add_global("LogBuffer", Struct(name="LogBuffer", parent=None))
+
+    # create the global LOGGER
+    add_global("LOGGER", GlobalVariable(name="LOGGER", 
+                                        parent=None, 
+                                        args={ "arguments": 
+                                                {
+                                                  "name": {"type": "t_string"},
+                                                  "actualStatus" : {"type": "t_string"},
+                                                  "previousStatus" : {"type": "t_string"},
+                                                  "buffer" : {"type": "LogBuffer"},
+                                                  "subBuffer" : {"type": "LogBuffer"},
+                                                  "pHealthStatus" : {"type": "t_string"},
+                                                  "pBusyStatus" : {"type": "t_string"}
+                                                }
+                                        }))
 
 
 class Process(FunctionBlock):
@@ -1074,7 +1255,7 @@ class Process(FunctionBlock):
             for var_name, var in args['references'].items():
                 v = Variable(var_name, self, var)
                 if QUALIFIERS.OPC_UA_DEACTIVATE not in v.qualifiers:
-                    v.qualifiers.append(QUALIFIERS.OPC_UA_DEACTIVATE)
+                    v.add_qualifier(QUALIFIERS.OPC_UA_DEACTIVATE)
                 self.var_inout[var_name] = v
 
                 
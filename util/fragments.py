@@ -0,0 +1,165 @@
+"""
+Helper module to cache the rendered <pou> and <dataType> fragments of the outputs across runs.
+
+Every fragment is stored under a fingerprint of the object it was rendered from. The fingerprint
+covers:
+ - the templates and the onto sources (the salt of the cache),
+ - the yaml arguments of the library item that created the object (its "origin", e.g. the
+   !STATEMACHINE that created a Status, see digest()),
+ - the resolved types of its variables, and the origins of these types, of the function blocks
+   it extends, and so on (transitively).
+
+An output that must be rendered again (according to the manifest) then only renders the fragments
+whose fingerprint changed, and copies the others from the cache. The fragments are only cached
+if a cache directory is given (see --cache).
+"""
+
+import hashlib, os, pickle, tempfile
+from pathlib import Path
+from util import logger
+from util.objects import Object
+from util.manifest import file_hash, template_dependencies
+
+
+# increase this number whenever the layout of the cache files changes
+SCHEMA = 1
+
+# the attributes holding the variables of a function block, method or struct
+VARIABLES = ("var_in", "var_out", "var_inout", "var_local", "attributes", "items")
+
+
+def digest(*values) -> str:
+    """
+    Return a hash of (parsed, but not yet created) yaml values, e.g. the tag and arguments of a library item.
+
+    Objects that already belong to a library (i.e. references that were resolved already) are
+    hashed by their qualified name, other objects (e.g. the expressions created by the yaml tags)
+    by their attributes.
+    """
+    h = hashlib.sha256()
+    seen = {}
+
+    def update(value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            h.update(f"{type(value).__name__}:{value!r};".encode())
+        elif isinstance(value, dict):
+            h.update(b"{")
+            for k, v in value.items():
+                update(k)
+                update(v)
+            h.update(b"}")
+        elif isinstance(value, (list, tuple)):
+            h.update(b"[")
+            for v in value:
+                update(v)
+            h.update(b"]")
+        elif id(value) in seen:
+            # a shared (or recursive) value
+            h.update(f"^{seen[id(value)]};".encode())
+        else:
+            seen[id(value)] = len(seen)
+            h.update(f"<{type(value).__name__}>".encode())
+            if isinstance(value, Object):
+                if value.parent is not None:
+                    update(value.qualified_name)
+                    return
+                attributes = value.as_dict()
+                attributes.pop("parent", None)
+                attributes.pop("resolved", None)
+            else:
+                attributes = getattr(value, '__dict__', {})
+            update(attributes)
+
+    update(values)
+    return h.hexdigest()
+
+
+def salt(sources_hash: str, template_fp: Path) -> str:
+    """Return the salt of the fragments of an output: a hash of the onto sources and of the templates."""
+    h = hashlib.sha256(f"{SCHEMA}:{sources_hash}".encode())
+    for fp in template_dependencies(template_fp):
+        h.update(f":{fp}:{file_hash(fp)}".encode())
+    return h.hexdigest()
+
+
+class FragmentCache:
+    """
+    The rendered fragments of a single output file, by fingerprint.
+    """
+
+    def __init__(self, fp: Path, salt: str) -> None:
+        self.fp = fp
+        self.salt = salt
+        self.fragments = {}
+        # the fragments used during this run (only these are saved)
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        if self.fp.exists():
+            try:
+                with open(self.fp, 'rb') as file:
+                    header, self.fragments = pickle.load(file)
+                if header != { "schema": SCHEMA }:
+                    raise ValueError(f"header mismatch ({header})")
+            except Exception as e:
+                logger.info(f"Ignoring invalid fragment cache {self.fp}: {e}")
+                self.fragments = {}
+
+    def fingerprint(self, node, indent: str) -> str | None:
+        """Return the fingerprint of an object rendered at the given indentation (or None if it has no origin)."""
+        if getattr(node, 'origin', None) is None:
+            return None
+        h = hashlib.sha256(f"{self.salt}:{indent!r}".encode())
+        seen = set()
+        todo = [node]
+        while len(todo) > 0:
+            type_ = todo.pop()
+            if type_ in seen:
+                continue
+            seen.add(type_)
+            h.update(f"<{type(type_).__name__} {type_.qualified_name} {getattr(type_, 'origin', None)}>".encode())
+            for variable in self.variables(type_):
+                for resolved in (variable.type, variable.points_to_type):
+                    if resolved is not None:
+                        h.update(f"{variable.name}:{resolved.qualified_name}:{getattr(resolved, 'plc_symbol', None)};".encode())
+                        todo.append(resolved)
+            extends = getattr(type_, 'extends', None)
+            if extends is not None:
+                todo.append(extends)
+        return h.hexdigest()
+
+    @staticmethod
+    def variables(node) -> list:
+        """Return the variables of a function block (and of its methods) or struct."""
+        result = []
+        for owner in [node, *getattr(node, 'methods', {}).values()]:
+            for attribute in VARIABLES:
+                variables = getattr(owner, attribute, None)
+                if isinstance(variables, dict):
+                    result += variables.values()
+        return result
+
+    def get(self, node, indent: str, render) -> str:
+        """Return the cached fragment of the object, or else render it by calling render()."""
+        key = self.fingerprint(node, indent)
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            fragment = render()
+        else:
+            self.hits += 1
+        if key is not None:
+            self.used[key] = fragment
+        return fragment
+
+    def save(self):
+        """Write the fragments that were used during this run to disk."""
+        self.fp.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.fp.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                pickle.dump(({ "schema": SCHEMA }, self.used), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.fp)
+        except Exception as e:
+            logger.info(f"Could not save the fragment cache {self.fp}: {e}")
+            Path(tmp).unlink(missing_ok=True)
@@ -0,0 +1,105 @@
+"""
+Helper module to determine the order in which the yaml models must be loaded.
+
+The "!IMPORT <file>" tags are scanned before any model is parsed, so that each
+model can be parsed (and constructed) exactly once, after all of its imports.
+"""
+
+import os, re
+from collections import Counter
+from pathlib import Path
+
+
+# a "!IMPORT models/in/some_file.yaml:" line
+IMPORT_PATTERN = re.compile(r"^\s*!IMPORT\s+(?P<path>[^\s#:][^#]*?)\s*:\s*(#.*)?$")
+
+
+class ImportCycleError(Exception):
+    """Raised when the imports of the models form a cycle."""
+
+    def __init__(self, cycle: list[Path]) -> None:
+        super().__init__("Import cycle detected: " + " -> ".join(str(fp) for fp in cycle))
+        self.cycle = cycle
+
+
+def normalize(fp: str | Path) -> Path:
+    """Normalize a path, so that the same file is always represented by the same key."""
+    return Path(os.path.normpath(str(fp).strip("'\"")))
+
+
+def scan_imports(input_fp: Path) -> list[Path]:
+    """Return the files imported by the given yaml file (without parsing the yaml)."""
+    imports = []
+    with open(input_fp, 'r') as file:
+        for line in file:
+            match = IMPORT_PATTERN.match(line)
+            if match is not None:
+                imports.append(normalize(match.group('path')))
+    return imports
+
+
+def build_graph(input_fps: list[Path]) -> dict[Path, list[Path]]:
+    """
+    Build the import graph of the given input files.
+
+    Files that are imported but not part of the input files are scanned too, so the
+    returned graph contains every file that needs to be loaded.
+    """
+    graph = {}
+    todo = [normalize(fp) for fp in input_fps]
+    while len(todo) > 0:
+        fp = todo.pop(0)
+        if fp in graph:
+            continue
+        graph[fp] = scan_imports(fp)
+        todo += [dep for dep in graph[fp] if dep not in graph]
+    return graph
+
+
+def topological_order(graph: dict[Path, list[Path]]) -> list[Path]:
+    """
+    Return the files of the graph in an order where every file comes after its imports.
+
+    Raises ImportCycleError if the imports are cyclic.
+    """
+    order = []
+    done = set()
+    visiting = []
+
+    def visit(fp):
+        if fp in done:
+            return
+        if fp in visiting:
+            raise ImportCycleError(visiting[visiting.index(fp):] + [fp])
+        visiting.append(fp)
+        for dep in graph[fp]:
+            visit(dep)
+        visiting.pop()
+        done.add(fp)
+        order.append(fp)
+
+    for fp in graph:
+        visit(fp)
+    return order
+
+
+def transitive_imports(graph: dict[Path, list[Path]], fp: Path) -> set[Path]:
+    """Return all files that are (directly or indirectly) imported by the given file."""
+    result = set()
+    todo = list(graph[fp])
+    while len(todo) > 0:
+        dep = todo.pop()
+        if dep not in result:
+            result.add(dep)
+            todo += graph[dep]
+    return result
+
+
+class ParseCounter(Counter):
+    """Counts how many times each file was parsed during a run."""
+
+    def check(self):
+        """Raise an exception if any file was parsed more than once."""
+        duplicates = { str(fp): n for fp, n in self.items() if n > 1 }
+        if len(duplicates) > 0:
+            raise Exception(f"Some files were parsed more than once: {duplicates}")
@@ -2,11 +2,14 @@
 Just a simple helper module to create a global logger.
 """
 
-import logging
+import logging, time
+
+# the time at which the program started
+START_TIME = time.time()
 
 class DeltaTimeFormatter(logging.Formatter):
     def format(self, record):
-        record.delta = "%5.1fs" % (record.relativeCreated / 1000)
+        record.delta = "%5.1fs" % (record.created - START_TIME)
         return super().format(record)
 
 
@@ -20,15 +23,58 @@ logging.getLogger().addHandler(handler)
 LOGGER = logging.getLogger("Onto")
 
 
+class RecordingHandler(logging.Handler):
+    """A handler that keeps the log records, so they can be replayed later (e.g. by another process)."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # format the message already, so the record doesn't refer to any (unpicklable) objects
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        self.records.append(record)
+
+
+def record() -> RecordingHandler:
+    """Stop printing the log messages, and record them instead."""
+    recorder = RecordingHandler()
+    logging.getLogger().removeHandler(handler)
+    logging.getLogger().addHandler(recorder)
+    return recorder
+
+def replay(records):
+    """Print log records that were recorded before."""
+    for r in records:
+        handler.handle(r)
+
+
+# whether debug messages are logged (updated by setLevel)
+DEBUG = LOGGER.isEnabledFor(logging.DEBUG)
+
 def setLevel(level):
+    global DEBUG
     LOGGER.setLevel(level)
+    DEBUG = LOGGER.isEnabledFor(logging.DEBUG)
+
+def getLevel():
+    return LOGGER.level
+
+def debugging() -> bool:
+    """Check if debug messages are logged, to avoid computing the arguments of debug() for nothing."""
+    return DEBUG
 
-def info(msg):
-    LOGGER.info(msg)
+# The messages are only formatted (as msg % args) if they're actually logged, so pass the
+# values to log as args, instead of formatting them into the message yourself.
 
-def debug(msg):
-    LOGGER.debug(msg)
+def info(msg, *args):
+    LOGGER.info(msg, *args)
 
-def error(msg):
-    LOGGER.error(msg)
+def debug(msg, *args):
+    if DEBUG:
+        LOGGER.debug(msg, *args)
 
+def error(msg, *args):
+    LOGGER.error(msg, *args)
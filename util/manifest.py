@@ -0,0 +1,120 @@
+"""
+Helper module to keep track of what every output file was built from.
+
+The manifest is stored in the output directory. For every output file, it records
+the hashes of its input file, of the (transitively) imported files, of the templates
+(including the ones reached via <%namespace>, <%include> or <%inherit>), of the onto
+sources, and of the output file itself. An output file only needs to be rebuilt if
+any of these hashes changed.
+"""
+
+import hashlib, json, os, re, tempfile
+from pathlib import Path
+from util import logger
+
+
+# increase this number whenever the layout of the manifest changes
+SCHEMA = 1
+
+MANIFEST_NAME = ".onto-manifest.json"
+
+# a <%namespace file="..."/>, <%include file="..."/> or <%inherit file="..."/> tag
+TEMPLATE_REFERENCE_PATTERN = re.compile(r"<%(namespace|include|inherit)\b[^>]*?\bfile\s*=\s*[\"'](?P<file>[^\"']+)[\"']")
+
+
+def file_hash(fp: Path) -> str:
+    """Return the hash of a file."""
+    return hashlib.sha256(fp.read_bytes()).hexdigest()
+
+
+def template_dependencies(template_fp: Path) -> list[Path]:
+    """Return the given template and all templates it (transitively) refers to."""
+    result = []
+    todo = [template_fp]
+    while len(todo) > 0:
+        fp = Path(os.path.normpath(todo.pop(0)))
+        if fp in result:
+            continue
+        result.append(fp)
+        for match in TEMPLATE_REFERENCE_PATTERN.finditer(fp.read_text()):
+            # like mako, resolve relative uris relative to the referring template
+            todo.append(fp.parent / match.group('file'))
+    return result
+
+
+class Manifest:
+    """
+    The manifest of an output directory.
+    """
+
+    def __init__(self, outputdir_fp: Path, sources_hash: str) -> None:
+        self.fp = outputdir_fp / MANIFEST_NAME
+        self.sources_hash = sources_hash
+        self.entries = {}
+        self.hashes = {}
+        if self.fp.exists():
+            try:
+                contents = json.loads(self.fp.read_text())
+                if contents["schema"] == SCHEMA:
+                    self.entries = contents["outputs"]
+            except Exception as e:
+                logger.info(f"Ignoring invalid manifest {self.fp}: {e}")
+
+    def hash(self, fp: Path) -> str:
+        """Return the hash of a file (each file is only hashed once per run)."""
+        key = str(fp)
+        if key not in self.hashes:
+            self.hashes[key] = file_hash(fp)
+        return self.hashes[key]
+
+    def entry(self, input_fp: Path, import_fps: list[Path], template_fp: Path) -> dict:
+        """Return the manifest entry describing what an output is built from."""
+        return {
+            "input": { str(input_fp): self.hash(input_fp) },
+            "imports": { str(fp): self.hash(fp) for fp in sorted(import_fps) },
+            "templates": { str(fp): self.hash(fp) for fp in template_dependencies(template_fp) },
+            "onto": self.sources_hash
+        }
+
+    def key(self, output_fp: Path) -> str:
+        """Return the key of an output file (i.e. its path relative to the output directory)."""
+        return Path(os.path.relpath(output_fp, self.fp.parent)).as_posix()
+
+    def check(self, output_fp: Path, input_fp: Path, import_fps: list[Path], template_fp: Path) -> str | None:
+        """Return the reason why the output must be rebuilt, or None if it's up to date."""
+        old = self.entries.get(self.key(output_fp))
+        if old is None:
+            return "it is not in the manifest"
+        if not output_fp.exists():
+            return "the output file does not exist"
+        if old.get("output") != self.hash(output_fp):
+            return "the output file was modified"
+        new = self.entry(input_fp, import_fps, template_fp)
+        if old.get("onto") != new["onto"]:
+            return "the onto sources changed"
+        for kind in ["input", "imports", "templates"]:
+            old_hashes = old.get(kind, {})
+            for fp, h in new[kind].items():
+                if fp not in old_hashes:
+                    return f"{fp} was added to the {kind}"
+                if old_hashes[fp] != h:
+                    return f"{fp} changed"
+            for fp in old_hashes:
+                if fp not in new[kind]:
+                    return f"{fp} was removed from the {kind}"
+        return None
+
+    def update(self, output_fp: Path, input_fp: Path, import_fps: list[Path], template_fp: Path):
+        """Record that the output was (re)built."""
+        entry = self.entry(input_fp, import_fps, template_fp)
+        self.hashes.pop(str(output_fp), None)
+        entry["output"] = self.hash(output_fp)
+        self.entries[self.key(output_fp)] = entry
+
+    def save(self):
+        """Write the manifest to disk."""
+        self.fp.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.fp.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump({ "schema": SCHEMA, "outputs": self.entries }, file, indent=2, sort_keys=True)
+        os.replace(tmp, self.fp)
@@ -1,4 +1,4 @@
-from util.expressions import UnaryOperation, BinaryOperation, \
+from util.expressions import UnaryOperation, BinaryOperation, NaryOperation, \
                             OPERATORS, \
                             load_binary_sequence, load_unary_sequence
 
@@ -7,33 +7,47 @@ from util.expressions import UnaryOperation, BinaryOperation, \
 PIVALUE =3.1415926535897932384626433
 
 
-# classes representing unary and binary operations
+# classes representing unary, binary and n-ary operations
 
 class ABS(UnaryOperation):
+    __slots__ = ()
+
     def __init__(self, operand) -> None:
         super().__init__(operand, OPERATORS.ABS)
 
-class SUM(BinaryOperation):
+class SUM(NaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.SUM)
 
 class SUB(BinaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.SUB)
 
-class MUL(BinaryOperation):
+class MUL(NaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.MUL)
 
 class DIV(BinaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.DIV)
 
 class POW(BinaryOperation):
+    __slots__ = ()
+
     def __init__(self, operands) -> None:
         super().__init__(operands, OPERATORS.POW)
     
 class NEG(UnaryOperation):
+    __slots__ = ()
+
     def __init__(self, operand) -> None:
         super().__init__(operand, OPERATORS.NEG)
 
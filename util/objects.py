@@ -1,85 +1,218 @@
 from __future__ import annotations # needed to enable circular type hints.
+import sys
 from util import logger
+from util.profiler import profiled
+from util.context import current
+
+
+class FrozenDict(dict):
+    """A read-only dict."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("This dict is read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __reduce__(self):
+        # there is only one instance, which must remain the same after pickling
+        return "EMPTY"
+
+
+# A shared empty dict, used instead of a new dict by the (many) objects that don't need one.
+# It is replaced by a real dict on the first write.
+EMPTY = FrozenDict()
 
 
 class Object:
     """A generic object has a name, a parent and 0 or more children."""
 
+    # the most common (sub)classes use slots instead of a __dict__, to save memory
+    __slots__ = ("name", "parent", "children", "resolved")
+
+    # the root namespace doesn't contribute to the qualified names of its descendants
+    is_root = False
+
     def __init__(self, name: str, parent: Object) -> None:
-        self.name = name
+        self.name = sys.intern(name) if isinstance(name, str) else name
         self.parent = parent
-        self.children = {}
+        self.children = EMPTY
         self.resolved = False
-        global OBJECTS
+        context = current()
+        context.created[type(self).__name__] += 1
+        if self.is_root:
+            context.symbols.root = self
         if name is not None:
             if parent is None:
-                OBJECTS[name] = self
+                context.symbols.add_global(name, self)
             else:
                 self.parent.register_child(name, self)
-                OBJECTS[f"{parent.name}.{name}"] = self
-        
+
+    @property
+    def qualified_name(self) -> str | None:
+        """The fully qualified name (library.namespace.type.member), or None for unnamed objects."""
+        if self.name is None:
+            return None
+        if self.parent is None or self.parent.is_root:
+            return self.name
+        parent_name = self.parent.qualified_name
+        return None if parent_name is None else f"{parent_name}.{self.name}"
+
+    def as_dict(self) -> dict:
+        """Return all attributes of the object (in its slots and in its __dict__, if any)."""
+        result = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(self, slot):
+                    result[slot] = getattr(self, slot)
+        result.update(getattr(self, '__dict__', {}))
+        return result
 
     def register_child(self, name, child):
+        if self.children is EMPTY:
+            self.children = {}
         self.children[name] = child
+        current().symbols.touch(name)
 
     def resolve_children(self, context):
         if self.resolved:
             return
         for child_name, child in self.children.items():
-            logger.debug(f"Resolving child {child_name} : {child}")
-            self.children[child_name] = resolve(child, context)
+            logger.debug("Resolving child %s : %s", child_name, child)
+            resolved = resolve(child, context)
+            if resolved is not child:
+                self.children[child_name] = resolved
+                current().symbols.touch(child_name)
         self.resolved = True
 
-    def get_child(self, name, recursive=True):
-        logger.debug(f"{self.name}.get_child({name})")
-        if name in self.children:
-            logger.debug(f" .. found {self.children[name]}")
-            return self.children[name]
-        
-        if recursive and self.parent is not None:
-            return self.parent.get_child(name)
-
-        raise Exception(f"{name} not found as child of {self.name}!")
-
+    def find_child(self, name, recursive=True, default=None):
+        """Return the child with the given name (searching the parents too, if recursive), or the default."""
+        child = current().symbols.find_child(self, name, recursive)
+        return default if child is _MISSING else child
 
-# global object store
-OBJECTS = {}
+    def get_child(self, name, recursive=True):
+        """Return the child with the given name (searching the parents too, if recursive)."""
+        child = current().symbols.find_child(self, name, recursive)
+        if child is _MISSING:
+            raise Exception(f"{name} not found as child of {self.name}!")
+        return child
+
+
+# returned by the lookups when nothing was found (None may be a valid child)
+_MISSING = object()
+
+
+class SymbolTable:
+    """
+    The symbol table: a tree of objects, rooted at the global namespace.
+
+    The tree itself is formed by the children of the objects, so an object is found by its
+    fully qualified name (library.namespace.type.member) by walking down from the root.
+    Objects without a parent (like the primitive types) and the objects added by add_global()
+    are also known by their plain name: these "globals" are found when a name cannot be
+    resolved in the scope of an object.
+
+    The lookups of a name within the scope of an object (i.e. in its children, or else in the
+    children of its parent, and so on) are cached per scope, including the misses. Every
+    registration of a child bumps the generation of its name (if that name was ever looked up),
+    so a cached lookup is only reused as long as no child with that name was (re)registered
+    anywhere since.
+    """
+
+    def __init__(self) -> None:
+        self.root = None
+        self.globals = {}
+        self.generations = {}
+        self.cache = {}
+
+    def touch(self, name: str):
+        """Record that a child with the given name was (re)registered somewhere."""
+        # only the names that were looked up before need to be tracked
+        if name in self.generations:
+            self.generations[name] += 1
+
+    def add_global(self, name: str, obj: Object):
+        """Register an object by its plain name."""
+        self.touch(name)
+        self.globals[name] = obj
+
+    def get_global(self, name: str) -> Object:
+        return self.globals[name]
+
+    def lookup(self, qualified_name: str, default=None):
+        """Return the object with the given fully qualified name."""
+        return self.find(qualified_name, self.root, default)
+
+    def find_child(self, scope: Object, name: str, recursive: bool = True):
+        """Find a name in the scope of an object (without the globals), or return _MISSING."""
+        if not recursive:
+            return scope.children.get(name, _MISSING)
+        generation = self.generations.setdefault(name, 0)
+        visited = []
+        result = _MISSING
+        node = scope
+        while node is not None:
+            # scopes without children (e.g. a variable that is still being created) are not worth caching
+            if len(node.children) > 0:
+                entry = self.cache.get((id(node), name))
+                if entry is not None and entry[0] is node and entry[1] == generation:
+                    result = entry[2]
+                    break
+                visited.append(node)
+                result = node.children.get(name, _MISSING)
+                if result is not _MISSING:
+                    break
+            node = node.parent
+
+        # all visited scopes resolve the name in the same way (or miss it in the same way)
+        for node in visited:
+            self.cache[(id(node), name)] = (node, generation, result)
+        return result
+
+    def find(self, path: str, context: Object = None, default=None):
+        """
+        Find a (dotted) path within the scope of the context, without raising if it's not found.
+
+        The first name of the path is searched in the children of the context, then of its parent,
+        and so on, and finally in the globals. Each following name is searched in the same way,
+        starting from the object found for the previous one.
+
+        The whole paths are not memoized: with every name cached per scope by find_child(), a
+        path costs a dict access per name already, and most paths are looked up only once per
+        scope (e.g. from each Process), so a memo of the paths made the builds slower.
+        """
+        obj = context
+        for name in path.split('.'):
+            found = _MISSING
+            if isinstance(obj, Object):
+                found = self.find_child(obj, name)
+            if found is _MISSING:
+                found = self.globals.get(name, _MISSING)
+                if found is _MISSING:
+                    return default
+            obj = found
+        return obj
 
 
 def add_global(name: str, obj: Object):
-    """Add an object to the global object store"""
-    global OBJECTS
-    OBJECTS[name] = obj
+    """Add an object to the global object store (of the current build context)"""
+    current().symbols.add_global(name, obj)
 
 def get_global(name: str):
-    """Access the global object store."""
-    global OBJECTS
-    return OBJECTS[name]
+    """Access the global object store (of the current build context)."""
+    return current().symbols.get_global(name)
 
+@profiled("resolve")
 def resolve(subject: str | Object, context: Object):
     """Resolve a subject within the context of another object."""
 
     if isinstance(subject, str):
-        parts = subject.split('.')
-        if len(parts) > 1:
-            return resolve( subject[len(f"{parts[0]}."):], resolve(parts[0], context) )
-
-        if context is not None:
-            try:
-                return context.get_child(subject)
-            except:
-                pass
-    
-        global OBJECTS
-        if subject in OBJECTS:
-            return OBJECTS[subject]
-        
-        raise KeyError(f"Subject '{subject}' was not declared before!")
+        result = current().symbols.find(subject, context, default=_MISSING)
+        if result is _MISSING:
+            raise KeyError(f"Subject '{subject}' was not declared before!")
+        return result
     
     elif isinstance(subject, Object):
         subject.resolve_children(context)
         return subject
     else:
         raise Exception(f"Resolve subject {subject} is unsupported")
-
-
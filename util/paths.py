@@ -0,0 +1,155 @@
+"""
+Helper module to resolve the paths via which the generated code refers to variables.
+
+A reference to a variable (the destination) is rendered relative to the scope of the code
+it appears in, i.e. a list of heads: the function block being rendered, or the method being
+rendered and the function block that owns it. The destination is reachable from a head if
+one of its ancestors is the head itself, or one of the function blocks that the head
+(transitively) extends. Global variables are always reachable via their own name.
+
+Objects are compared by identity, and the results are cached per destination and scope,
+so every reference is only resolved once (per library). Each build context has its own
+resolver.
+"""
+
+import pprint
+from util.factories import EnumItem, FunctionBlock, GlobalVariable, Method
+
+
+_MISSING = object()
+
+
+class PathNotFound(Exception):
+    """
+    Raised when a destination can't be reached from any head of the scope.
+
+    The exception only holds references to the objects involved. The diagnostic message (which
+    dumps these objects, and can be huge) is only formatted when the error is actually shown.
+    """
+
+    def __init__(self, dest, head, chain) -> None:
+        super().__init__(dest, head, chain)
+        self.dest = dest
+        self.head = head
+        self.chain = chain
+
+    def __str__(self):
+        dest, head = self.dest, self.head
+        dest_parent = dest.parent.name if dest.parent is not None else None
+        return ("Destination %s (%s) (ID %x) was not found as a subvariable of %s (%s)" %(dest.name, type(dest).__name__, id(dest), head.name, type(head).__name__)
+                + "\n\n"
+                + "Destination %s (child of parent %s) ID=%x :\n" % (dest.name, dest_parent, id(dest))
+                + pprint.pformat(dest.as_dict())
+                + "\n\n"
+                + "Destination parent:\n"
+                + (pprint.pformat(dest.parent.as_dict()) if dest.parent is not None else "None")
+                + "\n\n"
+                + "Head %s ID=%x :\n" % (head.name, id(head))
+                + pprint.pformat(head.as_dict())
+                + "\n\n"
+                + str(list(self.chain)))
+
+
+class PathResolver:
+    """
+    Resolves (and caches) the prefixes and paths of destinations within a scope.
+    """
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self):
+        """Forget all cached results (e.g. because another library was built)."""
+        self.results = {}
+        self.chains = {}
+
+    def chain(self, head) -> tuple:
+        """Return the head, followed by the function blocks it (transitively) extends."""
+        chain = self.chains.get(head)
+        if chain is None:
+            chain = [head]
+            extends = getattr(head, 'extends', None)
+            while extends is not None and extends not in chain:
+                chain.append(extends)
+                extends = getattr(extends, 'extends', None)
+            chain = tuple(chain)
+            self.chains[head] = chain
+        return chain
+
+    def path_to(self, dest, head) -> list | None:
+        """
+        Return the path from the head to the destination, or None if it's not reachable.
+
+        The path is the list of objects below the ancestor of the destination that matched,
+        up to and including the destination itself. If the matching ancestor is a global
+        variable, that global variable is included too.
+        """
+        if isinstance(dest, GlobalVariable):
+            return [dest]
+        if dest is head:
+            return []
+
+        ancestors = []
+        node = dest.parent
+        while node is not None:
+            ancestors.append(node)
+            node = node.parent
+
+        # a global variable, or the head itself, are preferred over the function blocks it extends
+        for k, ancestor in enumerate(ancestors):
+            if isinstance(ancestor, GlobalVariable):
+                return ancestors[k::-1] + [dest]
+            if ancestor is head:
+                return ancestors[k-1::-1] + [dest] if k > 0 else [dest]
+        extended = self.chain(head)[1:]
+        for k, ancestor in enumerate(ancestors):
+            if ancestor in extended:
+                return ancestors[k-1::-1] + [dest] if k > 0 else [dest]
+        return None
+
+    def resolve(self, dest, scope: list) -> tuple:
+        """
+        Return the prefix (e.g. "THIS^", "SUPER", a method name or None) and the path by which
+        the destination is referred to within the given scope.
+
+        Raises PathNotFound if the destination can't be reached from any head of the scope.
+        """
+        key = (dest, *scope)
+        result = self.results.get(key, _MISSING)
+        if result is _MISSING:
+            result = self._resolve(dest, scope)
+            self.results[key] = result
+        if result is None:
+            return None
+        # the path is a list, so return a copy that the caller may modify
+        return result[0], list(result[1])
+
+    def _resolve(self, dest, scope: list) -> tuple:
+        failure = None
+        for head in scope:
+            if isinstance(dest, EnumItem):
+                return None, [ dest.parent, dest ]
+
+            head_extends = getattr(head, 'extends', None)
+            if head_extends is not None and head_extends is getattr(dest, 'points_to_type', None):
+                return "SUPER", []
+
+            if isinstance(head, FunctionBlock):
+                path = self.path_to(dest, head)
+                if path is not None:
+                    # only explicitely mention THIS^ if there can be confusion (i.e. when the scope is > 1)
+                    return ("THIS^" if len(scope) > 1 else None), path
+            elif isinstance(head, Method):
+                # within the scope of a IEC61131-3 Method, the method itself is reachable via the method name
+                if dest is head:
+                    return dest.name, []
+                path = self.path_to(dest, head)
+                if path is not None:
+                    return None, path
+            else:
+                continue
+            failure = head
+
+        if failure is not None:
+            raise PathNotFound(dest, failure, self.chain(failure))
+        return None
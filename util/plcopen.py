@@ -0,0 +1,457 @@
+"""
+A native emitter of PLCopen TC6 XML, as an alternative to the Mako templates.
+
+It walks the library once, and writes the same output as templates/{filepath}.xml.mako
+(byte for byte) straight to a file, without the intermediate strings of nested <%def>
+calls. Every method below corresponds to a <%def> of templates/_iec61131.mako, so a
+change to the template must be made here too (benchmarks/bench_backend.py checks that
+both backends still produce the same output).
+"""
+
+import io
+from xml.sax.saxutils import escape as sax_escape
+from util import expressions
+from util.expressions import IfThen, BinaryOperation, NaryOperation, UnaryOperation, Bool, String
+from util.factories import Variable, Method, Call, FunctionBlock, Library
+from util.context import current
+from util.logger import info
+
+
+# the templates that can be rendered by the native backend
+TEMPLATES = ["{filepath}.xml.mako"]
+
+
+def escape(s):
+    return sax_escape(s, entities={
+        "'": "&#39;",
+        "\"": "&quot;",
+        "<": "&lt;",
+        ">": "&gt;"
+    })
+
+
+class Emitter:
+    """
+    Writes the PLCopen XML of a library to a (text) file.
+    """
+
+    def __init__(self, file, fragments=None) -> None:
+        self.write = file.write
+        self.fragments = fragments
+
+    def fragment(self, render, node, indent: str):
+        """Like the xml_fragment def: render the node, or copy it from the fragment cache."""
+        if self.fragments is None:
+            render(node, indent)
+        else:
+            self.write(self.fragments.get(node, indent, lambda: self.capture(render, node, indent)))
+
+    def capture(self, render, node, indent: str) -> str:
+        """Render the node to a string instead of to the file."""
+        write = self.write
+        buffer = io.StringIO()
+        self.write = buffer.write
+        try:
+            render(node, indent)
+        finally:
+            self.write = write
+        return buffer.getvalue()
+
+    def project(self, lib: Library, timestamp: str):
+        write = self.write
+        info(f"Rendering project {lib.name}")
+        write('<?xml version="1.0" encoding="utf-8"?>\n'
+              '<project xmlns="http://www.plcopen.org/xml/tc6_0200">\n'
+              f'  <fileHeader companyName="Institute of Astronomy" productName="Onto" productVersion="0.0.1" creationDateTime="{timestamp}" />\n'
+              f'  <contentHeader name="{lib.name}" modificationDateTime="{timestamp}">\n'
+              '    <coordinateInfo>\n'
+              '      <fbd>\n'
+              '        <scaling x="1" y="1" />\n'
+              '      </fbd>\n'
+              '      <ld>\n'
+              '        <scaling x="1" y="1" />\n'
+              '      </ld>\n'
+              '      <sfc>\n'
+              '        <scaling x="1" y="1" />\n'
+              '      </sfc>\n'
+              '    </coordinateInfo>\n'
+              '    <addData>\n'
+              '      <data name="http://www.3s-software.com/plcopenxml/projectinformation" handleUnknown="implementation">\n'
+              '        <ProjectInformation />\n'
+              '      </data>\n'
+              '    </addData>\n'
+              '  </contentHeader>\n'
+              '  <types>\n'
+              '    <dataTypes>\n')
+        enums = []
+        fbs = []
+        structs = []
+        lib.get_enums(recursive=True, enums=enums)
+        lib.get_fbs(recursive=True, fbs=fbs)
+        lib.get_structs(recursive=True, structs=structs)
+        for enum in enums:
+            write('      ')
+            self.fragment(self.enum, enum, '      ')
+            write('\n')
+        for struct in structs:
+            write('      ')
+            self.fragment(self.struct, struct, '      ')
+            write('\n')
+        write('    </dataTypes>\n'
+              '    <pous>\n')
+        for fb in fbs:
+            if fb.render:
+                write('      ')
+                self.fragment(self.pou_function_block, fb, '      ')
+                write('\n')
+        write('    </pous>\n'
+              '  </types>\n'
+              '  <instances>\n'
+              '    <configurations />\n'
+              '  </instances>\n'
+              '  <addData>\n'
+              '    <data name="http://www.3s-software.com/plcopenxml/projectstructure" handleUnknown="discard">\n'
+              '      <ProjectStructure>\n'
+              '        ')
+        self.folder(lib, set(), '        ')
+        write('\n'
+              '      </ProjectStructure>\n'
+              '    </data>\n'
+              '  </addData>\n'
+              '</project>')
+
+    def folder(self, node, already_rendered: set, indent: str):
+        write = self.write
+        namespaces = []
+        fbs = []
+        structs = []
+        enums = []
+        node.get_namespaces(recursive=False, namespaces=namespaces)
+        node.get_enums(recursive=False, enums=enums)
+        node.get_fbs(recursive=False, fbs=fbs)
+        node.get_structs(recursive=False, structs=structs)
+        types = [fb for fb in fbs if fb.render] + structs + enums
+        write(f'<Folder Name="{node.name}">\n')
+        for namespace in namespaces:
+            if namespace not in already_rendered:
+                write(f'{indent}  ')
+                self.folder(namespace, already_rendered, indent + '  ')
+                write('\n')
+                already_rendered.add(namespace)
+        for type_ in types:
+            if type_ not in already_rendered:
+                write(f'{indent}  ')
+                self.object(type_, indent + '  ')
+                write('\n')
+                already_rendered.add(type_)
+        write(f'{indent}</Folder>')
+
+    def object(self, node, indent: str):
+        write = self.write
+        write(f'<Object Name="{node.name}">\n')
+        if isinstance(node, FunctionBlock):
+            for method in node.methods.values():
+                write(f'{indent}  <Object Name="{method.name}" />\n')
+        write(f'{indent}</Object>')
+
+    def enum(self, enum, indent: str):
+        write = self.write
+        info(f"Rendering enum {enum.name}")
+        write(f'<dataType name="{enum.name}">\n'
+              f'{indent}  <baseType>\n'
+              f'{indent}    <enum>\n'
+              f'{indent}      <values>\n')
+        for item in enum.items:
+            write(f'{indent}        <value name="{item.name}" value="{item.number}" />\n')
+        write(f'{indent}      </values>\n'
+              f'{indent}    </enum>\n'
+              f'{indent}  </baseType>\n'
+              f'{indent}</dataType>')
+
+    def pou_function_block(self, fb, indent: str):
+        write = self.write
+        info(f"Rendering FunctionBlock {fb.name}")
+        write(f'<pou name="{fb.name}" pouType="functionBlock">\n'
+              f'{indent}  <interface>\n')
+        for kind, variables in (("input", fb.var_in), ("output", fb.var_out),
+                                ("inOut", fb.var_inout), ("local", fb.var_local)):
+            write(f'{indent}    ')
+            self.variables(kind, variables.values(), indent + '    ')
+            write('\n')
+        if fb.extends is not None:
+            write(f'{indent}    ')
+            self.pou_extends(fb.extends, indent + '    ')
+            write('\n')
+        write(f'{indent}  </interface>\n'
+              f'{indent}  <body>\n'
+              f'{indent}    <ST>\n')
+        if fb.implementation is not None:
+            write(f'{indent}      ')
+            self.implementation(fb.implementation, [ fb ])
+            write('\n')
+        write(f'{indent}    </ST>\n'
+              f'{indent}  </body>\n'
+              f'{indent}  <addData>\n')
+        if len(fb.methods) > 0:
+            write(f'{indent}    ')
+            self.methods(fb.methods.values(), fb, indent + '    ')
+            write('\n')
+        write(f'{indent}  </addData>\n'
+              f'{indent}</pou>')
+
+    def pou_extends(self, node, indent: str):
+        self.write(f'<addData>\n'
+                   f'{indent}  <data name="http://www.3s-software.com/plcopenxml/pouinheritance" handleUnknown="implementation">\n'
+                   f'{indent}    <Inheritance>\n'
+                   f'{indent}      <Extends>{node.name}</Extends>\n'
+                   f'{indent}    </Inheritance>\n'
+                   f'{indent}  </data>\n'
+                   f'{indent}</addData>')
+
+    def methods(self, methods, owner, indent: str):
+        for i, method in enumerate(methods):
+            if i > 0:
+                self.write(f'\n{indent}')
+            self.method(method, owner, indent)
+
+    def method(self, node, owner, indent: str):
+        write = self.write
+        write(f'<data name="http://www.3s-software.com/plcopenxml/method" handleUnknown="implementation">\n'
+              f'{indent}  <Method name="{node.name}">\n'
+              f'{indent}    <interface>\n')
+        if node.return_type is not None:
+            write(f'{indent}      <returnType>')
+            self.type_element(node.return_type)
+            write('</returnType>\n')
+        for kind, variables in (("input", node.var_in), ("output", node.var_out),
+                                ("inOut", node.var_inout), ("local", node.var_local)):
+            write(f'{indent}      ')
+            self.variables(kind, variables.values(), indent + '      ')
+            write('\n')
+        write(f'{indent}      <addData>\n'
+              f'{indent}        <data name="http://www.3s-software.com/plcopenxml/attributes" handleUnknown="implementation">\n'
+              f'{indent}          <Attributes>\n'
+              f'{indent}            <Attribute Name="TcRpcEnable" Value="1" />\n'
+              f'{indent}          </Attributes>\n'
+              f'{indent}        </data>\n'
+              f'{indent}      </addData>\n'
+              f'{indent}    </interface>\n'
+              f'{indent}    <body>\n'
+              f'{indent}      <ST>\n')
+        if node.implementation is not None:
+            write(f'{indent}        ')
+            self.implementation(node.implementation, [ node, owner ])
+            write('\n')
+        write(f'{indent}      </ST>\n'
+              f'{indent}    </body>\n'
+              f'{indent}  </Method>\n'
+              f'{indent}</data>')
+
+    def implementation(self, implementation, scope: list):
+        self.write('<xhtml xmlns="http://www.w3.org/1999/xhtml">')
+        self.expressions(implementation, scope, '')
+        self.write('</xhtml>')
+
+    def expressions(self, expressions, scope: list, indent: str):
+        if isinstance(expressions, list):
+            for i, e in enumerate(expressions):
+                if i > 0:
+                    self.write(indent)
+                self.expressions(e, scope, indent)
+                self.write(';\n')
+        else:
+            self.expression(expressions, scope, indent)
+
+    def variables(self, kind: str, variables, indent: str):
+        write = self.write
+        write(f'<{kind}Vars>\n')
+        for v in variables:
+            write(f'{indent}  ')
+            self.variable(v, indent + '  ')
+            write('\n')
+        write(f'{indent}</{kind}Vars>')
+
+    def expression(self, e, scope: list, indent: str):
+        if e is None or scope is None:
+            raise Exception("layoutExpression with None argument!")
+        if isinstance(e, IfThen):
+            self.if_then(e, scope, indent)
+        elif isinstance(e, BinaryOperation):
+            self.binary_operation(e, scope)
+        elif isinstance(e, NaryOperation):
+            self.nary_operation(e, scope)
+        elif isinstance(e, UnaryOperation):
+            self.unary_operation(e, scope)
+        elif isinstance(e, (Variable, Method)):
+            self.path(e, scope)
+        elif isinstance(e, expressions.Primitive):
+            self.value(e)
+        elif isinstance(e, Call):
+            self.call(e, scope, indent)
+        elif isinstance(e, list):
+            self.expressions(e, scope, indent)
+        else:
+            raise Exception("ERROR in layoutExpression(%s)" %(e.name))
+
+    def if_then(self, node, scope: list, indent: str, more: str = '    '):
+        write = self.write
+        write('IF ')
+        self.expression(node.if_, scope, '')
+        write(f' THEN\n{indent}{more}')
+        self.expressions(node.then_, scope, indent + more)
+        if node.else_ is not None:
+            write(f'{indent}ELSE\n{indent}{more}')
+            self.expressions(node.else_, scope, indent + more)
+        write(f'{indent}END_IF')
+
+    def value(self, node):
+        if isinstance(node, Bool):
+            self.write(str(node.value).upper())
+        elif isinstance(node, String):
+            self.write(escape("'" + str(node.value) + "'"))
+        else:
+            self.write(str(node.value))
+
+    def binary_operation(self, node, scope: list):
+        write = self.write
+        symbol = node.operator.plc_symbol
+        if symbol is None:
+            raise Exception("Unknown symbol in layoutBinaryOperation(%s) for operator %s" %(node, node.operator))
+        if symbol == ":=":
+            self.expression(node.left, scope, '')
+            write(f' {symbol} ')
+            self.expression(node.right, scope, '')
+            return
+        for operand, separator in ((node.left, f' {escape(symbol)} '), (node.right, None)):
+            if isinstance(operand, (Variable, expressions.Primitive)):
+                self.expression(operand, scope, '')
+            else:
+                write('(')
+                self.expression(operand, scope, '')
+                write(')')
+            if separator is not None:
+                write(separator)
+
+    def nary_operation(self, node, scope: list):
+        write = self.write
+        symbol = node.operator.plc_symbol
+        if symbol is None:
+            raise Exception("Unknown symbol in layoutNaryOperation(%s) for operator %s" %(node, node.operator))
+        separator = f' {escape(symbol)} '
+        for i, operand in enumerate(node.operands):
+            if i > 0:
+                write(separator)
+            if isinstance(operand, (Variable, expressions.Primitive)):
+                self.expression(operand, scope, '')
+            else:
+                write('(')
+                self.expression(operand, scope, '')
+                write(')')
+
+    def path(self, dest, scope: list):
+        prefix, path = current().paths.resolve(dest, scope)
+        if prefix is not None:
+            self.write(str(prefix))
+            if len(path) > 0:
+                self.write('.')
+        self.write('.'.join(str(item.name) for item in path))
+
+    def assignment(self, node, scope: list):
+        self.write(f'{node.left.name} := ')
+        self.expression(node.right, scope, '')
+
+    def call(self, node, scope: list, indent: str, more: str = '    '):
+        write = self.write
+        if isinstance(node.calls, UnaryOperation):
+            self.unary_operation(node.calls, scope)
+        else:
+            self.path(node.calls, scope)
+        write('(')
+        if len(node.assignments) == 0:
+            write(')')
+        elif len(node.assignments) == 1:
+            write(' ')
+            self.assignment(node.assignments[0], scope)
+            write(' )')
+        else:
+            write('\n')
+            for i, assignment in enumerate(node.assignments):
+                write(indent + more)
+                self.assignment(assignment, scope)
+                write(')' if i == len(node.assignments) - 1 else ',\n')
+
+    def unary_operation(self, node, scope: list):
+        symbol = node.operator.plc_symbol
+        if symbol is None:
+            raise Exception("Unknown symbol in layoutUnaryOperation(%s) for operator %s" %(node.name, node.operator.name))
+        if symbol == '^':
+            self.expression(node.operand, scope, '')
+            self.write('^')
+        else:
+            self.write(f'{symbol}(')
+            self.expression(node.operand, scope, '')
+            self.write(')')
+
+    def variable(self, node, indent: str):
+        write = self.write
+        if node.address is not None:
+            write(f'<variable name="{node.name}" address="{node.address}">\n')
+        else:
+            write(f'<variable name="{node.name}">\n')
+        write(f'{indent}  <type>')
+        self.type_contents(node)
+        write('</type>\n')
+        if node.initial is not None:
+            write(f'{indent}  <initialValue><simpleValue value="{escape(str(node.initial.value).upper())}" /></initialValue>\n')
+        if node.qualifiers is not None:
+            write(f'{indent}  <addData>\n'
+                  f'{indent}    <data name="http://www.3s-software.com/plcopenxml/attributes" handleUnknown="implementation">\n'
+                  f'{indent}      <Attributes>\n')
+            for qualifier in node.qualifiers:
+                write(f'{indent}        <Attribute Name="{qualifier.plc_symbol}" Value="{qualifier.value}" />\n')
+            write(f'{indent}      </Attributes>\n'
+                  f'{indent}    </data>\n'
+                  f'{indent}  </addData>\n')
+        if node.comment is not None:
+            write(f'{indent}  <documentation>\n'
+                  f'{indent}    <xhtml xmlns="http://www.w3.org/1999/xhtml">{escape(node.comment)}</xhtml>\n'
+                  f'{indent}  </documentation>\n')
+        write(f'{indent}</variable>')
+
+    def type_element(self, node):
+        if node.plc_symbol is not None:
+            # for some reason, STRING must be rendered lowercase, otherwise you cannot import the file in TwinCAT !!!
+            if node.plc_symbol == 'STRING':
+                self.write('<string />')
+            else:
+                self.write(f'<{node.plc_symbol} />')
+        else:
+            self.write(f'<derived name="{node.name}" />')
+
+    def type_contents(self, node):
+        if node.type is not None:
+            self.type_element(node.type)
+        elif node.points_to_type is not None:
+            self.write('<pointer><baseType>')
+            self.type_element(node.points_to_type)
+            self.write('</baseType></pointer>')
+
+    def struct(self, node, indent: str):
+        write = self.write
+        info(f"Rendering Struct {node.name}")
+        write(f'<dataType name="{node.name}">\n'
+              f'{indent}  <baseType>\n'
+              f'{indent}    <struct>\n')
+        for item in node.items.values():
+            write(f'{indent}      ')
+            self.variable(item, indent + '      ')
+            write('\n')
+        write(f'{indent}    </struct>\n'
+              f'{indent}  </baseType>\n'
+              f'{indent}</dataType>')
+
+
+def emit(lib: Library, file, fragments=None):
+    """Write the PLCopen XML of a library (like templates/{filepath}.xml.mako) to a text file."""
+    with lib.context.active():
+        Emitter(file, fragments).project(lib, lib.context.timestamp)
@@ -0,0 +1,192 @@
+"""
+Helper module to measure where the time goes, per model and per phase.
+
+The phases are exclusive: when a phase starts within another one (e.g. "resolve" during
+"create"), the time is charged to the inner phase only. So the phases of a model add up
+to the total time spent on it.
+
+The time a worker process (see --jobs) spends on loading the imports of a model is charged
+to that model as "imports", which is not part of its total: the imports have their own rows
+already, as in a sequential run.
+"""
+
+import functools, json, os, sys, tempfile, time
+from collections import Counter
+from pathlib import Path
+from util import logger
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+PHASES = ["parse", "create", "resolve", "compile", "render", "write"]
+
+# the default name of the json report, in the output directory
+PROFILE_NAME = ".onto-profile.json"
+
+
+def peak_rss() -> int | None:
+    """Return the peak resident set size of this process in bytes (or None if unknown)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Profiler:
+    """
+    Collects the time per model and per phase, and the number of created objects per model.
+
+    The results of the worker processes are merged into the ones of the main process, and so
+    is their peak memory usage.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.clear()
+
+    def clear(self):
+        self.models = {}
+        self.model = None
+        # whether the time is charged to the imports of the model
+        self.imports = False
+        self.stack = []
+        self.peak_rss_workers = None
+        self.t_last = time.perf_counter()
+
+    def entry(self, model: str) -> dict:
+        if model not in self.models:
+            self.models[model] = { "phases": { phase: 0.0 for phase in PHASES },
+                                   "imports": 0.0,
+                                   "objects": Counter() }
+        return self.models[model]
+
+    def _charge(self):
+        """Charge the time since the last switch to the current phase."""
+        t_now = time.perf_counter()
+        if self.model is not None and len(self.stack) > 0:
+            entry = self.entry(self.model)
+            if self.imports:
+                entry["imports"] += t_now - self.t_last
+            else:
+                entry["phases"][self.stack[-1]] += t_now - self.t_last
+        self.t_last = t_now
+
+    def start(self, model: Path | str | None, imports: bool = False):
+        """From now on, charge the time to the given model (or to none, if None), or to its imports."""
+        if self.enabled:
+            self._charge()
+            self.model = None if model is None else str(model)
+            self.imports = imports
+
+    def enter(self, phase: str):
+        if self.enabled:
+            self._charge()
+            self.stack.append(phase)
+
+    def leave(self):
+        if self.enabled:
+            self._charge()
+            self.stack.pop()
+
+    def count_objects(self, created: Counter):
+        """Add the number of objects (per class) that were created for the current model."""
+        if self.enabled and self.model is not None:
+            self.entry(self.model)["objects"].update(created)
+
+    def merge(self, models: dict, peak_rss: int = None):
+        """Merge the results of another profiler (e.g. of a worker process, with its peak memory usage)."""
+        for model, other in models.items():
+            entry = self.entry(model)
+            for phase, t in other["phases"].items():
+                entry["phases"][phase] += t
+            entry["imports"] += other["imports"]
+            entry["objects"].update(other["objects"])
+        if peak_rss is not None:
+            self.peak_rss_workers = max(peak_rss, self.peak_rss_workers or 0)
+
+    def results(self) -> dict:
+        """Return the results, sorted by the total time per model (slowest first)."""
+        models = {}
+        for model, entry in self.models.items():
+            models[model] = { "total": sum(entry["phases"].values()),
+                              "phases": dict(entry["phases"]),
+                              "imports": entry["imports"],
+                              "objects": sum(entry["objects"].values()),
+                              "objects_per_class": dict(entry["objects"].most_common()) }
+        models = dict(sorted(models.items(), key=lambda item: item[1]["total"], reverse=True))
+        totals = { phase: sum(m["phases"][phase] for m in models.values()) for phase in PHASES }
+        return { "models": models,
+                 "totals": { "total": sum(totals.values()),
+                             "phases": totals,
+                             "imports": sum(m["imports"] for m in models.values()),
+                             "objects": sum(m["objects"] for m in models.values()) },
+                 "peak_rss": peak_rss(),
+                 "peak_rss_workers": self.peak_rss_workers }
+
+    def report(self, json_fp: Path = None):
+        """Log the results as a table (and save them as json, if a file is given)."""
+        results = self.results()
+        width = max([len(m) for m in results["models"]] + [len("TOTAL")])
+        # the imports are only loaded separately by the worker processes
+        imports = results["totals"]["imports"] > 0
+        lines = ["Profile (in seconds):",
+                 f"{'model':{width}s} " + " ".join(f"{p:>8s}" for p in PHASES + ["total"])
+                 + (f" {'imports':>8s}" if imports else "") + f" {'objects':>8s}"]
+        rows = list(results["models"].items()) + [("TOTAL", results["totals"])]
+        for model, r in rows:
+            lines.append(f"{model:{width}s} " + " ".join(f"{r['phases'][p]:8.2f}" for p in PHASES)
+                         + f" {r['total']:8.2f}" + (f" {r['imports']:8.2f}" if imports else "") + f" {r['objects']:8d}")
+        if imports:
+            lines.append("(imports: the time the workers spent on loading the imports of a model, not part of its total)")
+        if results["peak_rss"] is not None:
+            line = "Peak RSS: %.1f MiB" % (results["peak_rss"] / 2**20)
+            if results["peak_rss_workers"] is not None:
+                line += " (main process), %.1f MiB (largest worker)" % (results["peak_rss_workers"] / 2**20)
+            lines.append(line)
+        logger.info("\n".join(lines))
+
+        if json_fp is not None:
+            json_fp.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=json_fp.parent, suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                json.dump(results, file, indent=2)
+            os.replace(tmp, json_fp)
+            logger.info(f"Saved the profile as {json_fp}")
+
+
+# the profiler of this process (disabled by default), shared by all builds that run in it
+PROFILER = Profiler()
+
+
+class phase:
+    """Context manager to charge the time of a block to the given phase."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self):
+        PROFILER.enter(self.name)
+
+    def __exit__(self, *exc):
+        PROFILER.leave()
+
+
+def profiled(name: str):
+    """Decorator to charge the time of a function to the given phase."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            PROFILER.enter(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.leave()
+        return wrapper
+    return decorator